@@ -20,10 +20,13 @@ DEFAULT_CITY_SPEED_LIMIT = 30
 DEFAULT_COMPUTE_PARTS = constant.COMPUTE_PARTS_ALL
 DEFAULT_CONTAINER_NAME = "brokenspoke-analyzer"
 DEFAULT_DATA_DIR = pathlib.Path("./data").resolve()
+DEFAULT_DURABILITY = constant.Durability.DURABLE
 DEFAULT_DOCKER_IMAGE = "azavea/pfb-network-connectivity:0.19.0"
 DEFAULT_EXPORT_DIR = pathlib.Path("./results").resolve()
+DEFAULT_EXPORT_FORMATS = constant.EXPORT_FORMATS_DEFAULT
 DEFAULT_LODES_YEAR = 2022
 DEFAULT_MAX_TRIP_DISTANCE = 2680
+DEFAULT_OSM_IMPORT_MODE = constant.OSMImportMode.SPLIT
 DEFAULT_RETRIES = 2
 DEFAULT_WORLDPOP_YEAR: int = datetime.now(tz=UTC).year
 
@@ -49,6 +52,10 @@ CacheDir = Annotated[
         help="path to the cache directory",
     ),
 ]
+BundleCompression = Annotated[
+    constant.BundleCompression,
+    typer.Option(help="compression method of the zip archive bundling the files"),
+]
 City = Annotated[str, typer.Argument()]
 ComputeParts = Annotated[
     list[constant.ComputePart] | None,
@@ -69,10 +76,21 @@ DataDir = Annotated[
         help="directory where the files to import are located",
     ),
 ]
+Delta = Annotated[
+    bool,
+    typer.Option(
+        help="copy the files unchanged since the previous release instead of "
+        "uploading them, ignoring the export date of the shapefiles"
+    ),
+]
 DockerImage = Annotated[
     str | None,
     typer.Option(help="override the BNA Docker image"),
 ]
+Durability = Annotated[
+    constant.Durability,
+    typer.Option(help="trade the durability of the database for speed"),
+]
 export_dir_kwargs = {
     "file_okay": False,
     "dir_okay": True,
@@ -82,6 +100,14 @@ export_dir_kwargs = {
 }
 ExportDirArg = Annotated[pathlib.Path, typer.Argument(**export_dir_kwargs)]  # ty:ignore[no-matching-overload]
 ExportDirOpt = Annotated[pathlib.Path, typer.Option(**export_dir_kwargs)]  # ty:ignore[no-matching-overload]
+ExportFormats = Annotated[
+    list[constant.ExportFormat] | None,
+    typer.Option(help="file formats to export the tables to"),
+]
+ExportProfile = Annotated[
+    constant.ExportProfile,
+    typer.Option(help="profile selecting the columns and the geometry precision"),
+]
 FIPSCode = Annotated[str, typer.Argument(help="US city FIPS code")]
 LODESYear = Annotated[
     int | None,
@@ -96,6 +122,15 @@ NoCache = Annotated[
     bool | None,
     typer.Option("--no-cache", help="disable the cache folder"),
 ]
+OSMImportMode = Annotated[
+    constant.OSMImportMode,
+    typer.Option(
+        help=(
+            "strategy used to import the OSM data "
+            "(consolidated runs a single osm2pgrouting pass)"
+        ),
+    ),
+]
 Region = Annotated[
     str | None,
     typer.Argument(help="world region (e.g., state, province, community, etc...)"),
@@ -41,7 +41,7 @@ def compute_cmd(
         raise ValueError("`buffer` must be set")
 
     # Prepare the database connection.
-    engine = dbcore.create_psycopg_engine(database_url)
+    engine = dbcore.get_engine(database_url)
 
     # Prepare directories.
     country = utils.normalize_country_name(country)
@@ -4,13 +4,25 @@ from typing import Annotated
 
 import rich
 import typer
+from loguru import logger
+from rich.table import Table
 
 from brokenspoke_analyzer.cli import common
+from brokenspoke_analyzer.core import ingestor
 from brokenspoke_analyzer.core.database import dbcore
 
 Cores = Annotated[int, typer.Argument(help="number of cores")]
+CoresOpt = Annotated[
+    int | None,
+    typer.Option(help="number of cores, detected from the server by default"),
+]
 MemoryMB = Annotated[int, typer.Argument(help="memory amount in MB")]
+MemoryMBOpt = Annotated[
+    int | None,
+    typer.Option(help="memory amount in MB, detected from the server by default"),
+]
 PGUser = Annotated[str, typer.Argument(help="PostgreSQL user name to connect as")]
+TemplateName = Annotated[str, typer.Option(help="name of the template database")]
 
 
 app = typer.Typer()
@@ -18,11 +30,92 @@ console = rich.get_console()
 
 
 @app.command()
-def docker(database_url: common.DatabaseURL) -> None:
+def docker(
+    database_url: common.DatabaseURL,
+    durability: common.Durability = common.DEFAULT_DURABILITY,
+) -> None:
     """Configure a database running in a Docker container."""
     console.log("[green]Configuring the Docker database...")
-    engine = dbcore.create_psycopg_engine(database_url)
-    dbcore.configure_docker_db(engine)
+    engine = dbcore.get_engine(database_url)
+    dbcore.configure_docker_db(engine, durability)
+
+
+@app.command()
+def auto(
+    database_url: common.DatabaseURL,
+    durability: common.Durability = common.DEFAULT_DURABILITY,
+) -> None:
+    """Configure a database with the resources detected from its server."""
+    console.log("[green]Configuring the database with detected resources...")
+    engine = dbcore.get_engine(database_url)
+    pguser = engine.url.username
+    if not pguser:
+        raise ValueError("postgresql user must be specified in the database URL")
+    cores, memory_mb = dbcore.detect_resources(engine)
+    console.log(f"Detected {cores} cores and {memory_mb}MB of memory")
+    dbcore.configure_db(engine, cores, memory_mb, pguser, durability)
+
+
+@app.command()
+def check(
+    database_url: common.DatabaseURL,
+    cores: CoresOpt = None,
+    memory_mb: MemoryMBOpt = None,
+    durability: common.Durability = common.DEFAULT_DURABILITY,
+) -> None:
+    """Check that the settings in effect match the recommended ones."""
+    engine = dbcore.get_engine(database_url)
+    if not (cores and memory_mb):
+        detected_cores, detected_memory_mb = dbcore.detect_resources(engine)
+        cores = cores or detected_cores
+        memory_mb = memory_mb or detected_memory_mb
+    expected = dbcore.recommended_settings(cores, memory_mb, durability)
+    checks = dbcore.check_settings(engine, expected)
+
+    table = Table(title=f"Settings for {cores} cores and {memory_mb}MB of memory")
+    table.add_column("Setting")
+    table.add_column("Expected")
+    table.add_column("Actual")
+    table.add_column("Status")
+    for setting in checks:
+        if setting.ok:
+            status = "[green]ok"
+        elif setting.pending_restart:
+            status = "[yellow]pending restart"
+        else:
+            status = "[red]mismatch"
+        actual = f"{setting.actual}{setting.unit or ''}" if setting.actual else ""
+        table.add_row(setting.name, setting.expected, actual, status)
+    console.print(table)
+    if not all(setting.ok for setting in checks):
+        raise typer.Exit(code=1)
+
+
+def preflight(database_url: str) -> bool:
+    """
+    Warn about the settings in effect not matching the recommended ones.
+
+    The recommended settings are based on the detected resources of the server
+    and on its current durability profile. Returns whether they match.
+    """
+    engine = dbcore.get_engine(database_url)
+    try:
+        cores, memory_mb = dbcore.detect_resources(engine)
+    except ValueError as e:
+        logger.warning(f"skipping the database preflight check: {e}")
+        return True
+    durability = dbcore.current_durability(engine)
+    expected = dbcore.recommended_settings(cores, memory_mb, durability)
+    mismatches = [s for s in dbcore.check_settings(engine, expected) if not s.ok]
+    for setting in mismatches:
+        logger.warning(
+            f"database setting {setting.name} is {setting.actual}"
+            f"{setting.unit or ''} instead of {setting.expected}"
+            + (" (pending restart)" if setting.pending_restart else "")
+        )
+    if mismatches:
+        logger.warning("run `bna configure check` for a complete report")
+    return not mismatches
 
 
 @app.command()
@@ -31,27 +124,33 @@ def custom(
     memory_mb: MemoryMB,
     pguser: PGUser,
     database_url: common.DatabaseURL,
+    durability: common.Durability = common.DEFAULT_DURABILITY,
 ) -> None:
     """Configure a database with custom values."""
     console.log("[green]Configuring the database with custom settings...")
-    system(database_url, cores, memory_mb)
+    system(database_url, cores, memory_mb, durability)
     extensions(database_url)
     schemas(database_url, pguser)
 
 
 @app.command()
-def system(database_url: common.DatabaseURL, cores: Cores, memory_mb: MemoryMB) -> None:
+def system(
+    database_url: common.DatabaseURL,
+    cores: Cores,
+    memory_mb: MemoryMB,
+    durability: common.Durability = common.DEFAULT_DURABILITY,
+) -> None:
     """Configure the database system parameters."""
     console.log("[green]Configuring the system parameters...")
-    engine = dbcore.create_psycopg_engine(database_url)
-    dbcore.configure_system(engine, cores, memory_mb)
+    engine = dbcore.get_engine(database_url)
+    dbcore.configure_system(engine, cores, memory_mb, durability)
 
 
 @app.command()
 def extensions(database_url: common.DatabaseURL) -> None:
     """Configure the database extensions."""
     console.log("[green]Configuring the extensions...")
-    engine = dbcore.create_psycopg_engine(database_url)
+    engine = dbcore.get_engine(database_url)
     dbcore.configure_extensions(engine)
 
 
@@ -59,7 +158,7 @@ def extensions(database_url: common.DatabaseURL) -> None:
 def schemas(database_url: common.DatabaseURL, pguser: PGUser) -> None:
     """Configure the database schemas."""
     console.log("[green]Configuring the schemas...")
-    engine = dbcore.create_psycopg_engine(database_url)
+    engine = dbcore.get_engine(database_url)
     dbcore.configure_schemas(engine, pguser)
 
 
@@ -67,5 +166,36 @@ def schemas(database_url: common.DatabaseURL, pguser: PGUser) -> None:
 def reset(database_url: common.DatabaseURL) -> None:
     """Reset the database tables created by a BNA run."""
     console.log("[green]Resetting the database tables...")
-    engine = dbcore.create_psycopg_engine(database_url)
+    engine = dbcore.get_engine(database_url)
     dbcore.reset_tables(engine)
+
+
+@app.command()
+def template(
+    database_url: common.DatabaseURL,
+    name: TemplateName = dbcore.TEMPLATE_DATABASE,
+) -> None:
+    """
+    Create a template database to create the analysis databases from.
+
+    The template contains the extensions, the schemas and the speed tables, and
+    replaces any existing template with the same name.
+    """
+    console.log(f"[green]Creating the template database {name}...")
+    engine = dbcore.get_engine(database_url)
+    pguser = engine.url.username
+    if not pguser:
+        raise ValueError("postgresql user must be specified in the database URL")
+    if dbcore.template_exists(engine, name):
+        dbcore.mark_template(engine, name, is_template=False)
+    dbcore.create_database(engine, name)
+
+    # A database cannot be copied while being connected to.
+    template_url = dbcore.database_url_for(database_url, name)
+    template_engine = dbcore.get_engine(template_url)
+    dbcore.configure_extensions(template_engine)
+    dbcore.configure_schemas(template_engine, pguser)
+    ingestor.create_speed_tables(template_engine)
+    dbcore.dispose_engine(template_url)
+
+    dbcore.mark_template(engine, name)
@@ -10,7 +10,10 @@ from click.core import ParameterSource
 from loguru import logger
 
 from brokenspoke_analyzer.cli import common
-from brokenspoke_analyzer.core import exporter
+from brokenspoke_analyzer.core import (
+    constant,
+    exporter,
+)
 
 app = typer.Typer()
 console = rich.get_console()
@@ -66,8 +69,11 @@ def local(
     city: common.City,
     region: common.Region = None,
     export_dir: common.ExportDirArg = common.DEFAULT_EXPORT_DIR,
+    with_formats: common.ExportFormats = common.DEFAULT_EXPORT_FORMATS,
     *,
     with_bundle: common.WithBundle = False,
+    bundle_compression: common.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: common.ExportProfile = constant.ExportProfile.FULL,
 ) -> pathlib.Path:
     """Export results to a directory following the PFB calver convention."""
     dir_ = exporter.create_calver_directories(
@@ -77,7 +83,14 @@ def local(
         base_dir=export_dir,
     )
     logger.debug(f"{dir_=}")
-    _local(database_url=database_url, export_dir=dir_, with_bundle=with_bundle)
+    _local(
+        database_url=database_url,
+        export_dir=dir_,
+        formats=with_formats or common.DEFAULT_EXPORT_FORMATS,
+        with_bundle=with_bundle,
+        bundle_compression=bundle_compression,
+        profile=profile,
+    )
     return dir_
 
 
@@ -85,11 +98,21 @@ def local(
 def local_custom(
     database_url: common.DatabaseURL,
     export_dir: common.ExportDirArg,
+    with_formats: common.ExportFormats = common.DEFAULT_EXPORT_FORMATS,
     *,
     with_bundle: common.WithBundle = False,
+    bundle_compression: common.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: common.ExportProfile = constant.ExportProfile.FULL,
 ) -> None:
     """Export results to a custom directory."""
-    _local(database_url=database_url, export_dir=export_dir, with_bundle=with_bundle)
+    _local(
+        database_url=database_url,
+        export_dir=export_dir,
+        formats=with_formats or common.DEFAULT_EXPORT_FORMATS,
+        with_bundle=with_bundle,
+        bundle_compression=bundle_compression,
+        profile=profile,
+    )
 
 
 @app.command()
@@ -99,8 +122,12 @@ def s3(
     country: common.Country,
     city: common.City,
     region: common.Region = None,
+    with_formats: common.ExportFormats = common.DEFAULT_EXPORT_FORMATS,
     *,
     with_bundle: common.WithBundle = False,
+    bundle_compression: common.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: common.ExportProfile = constant.ExportProfile.FULL,
+    delta: common.Delta = False,
 ) -> pathlib.Path:
     """Export results to a S3 bucket following the PFB calver convention."""
     with console.status("[green]Uploading results to AWS S3..."):
@@ -111,7 +138,11 @@ def s3(
                 country,
                 city,
                 region,
+                formats=with_formats or common.DEFAULT_EXPORT_FORMATS,
                 with_bundle=with_bundle,
+                bundle_compression=bundle_compression,
+                profile=profile,
+                delta=delta,
             ),
         )
 
@@ -121,13 +152,24 @@ def s3_custom(
     database_url: common.DatabaseURL,
     bucket_name: str,
     s3_dir: pathlib.Path = pathlib.Path(),
+    with_formats: common.ExportFormats = common.DEFAULT_EXPORT_FORMATS,
     *,
     with_bundle: common.WithBundle = False,
+    bundle_compression: common.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: common.ExportProfile = constant.ExportProfile.FULL,
 ) -> pathlib.Path:
     """Export results to a custom S3 bucket."""
     with console.status("[green]Uploading results to AWS S3..."):
         return asyncio.run(
-            s3_custom_(database_url, bucket_name, s3_dir, with_bundle=with_bundle)
+            s3_custom_(
+                database_url,
+                bucket_name,
+                s3_dir,
+                formats=with_formats or common.DEFAULT_EXPORT_FORMATS,
+                with_bundle=with_bundle,
+                bundle_compression=bundle_compression,
+                profile=profile,
+            )
         )
 
 
@@ -141,8 +183,12 @@ def r2(
     country: common.Country,
     city: common.City,
     region: common.Region = None,
+    with_formats: common.ExportFormats = common.DEFAULT_EXPORT_FORMATS,
     *,
     with_bundle: bool = False,
+    bundle_compression: common.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: common.ExportProfile = constant.ExportProfile.FULL,
+    delta: common.Delta = False,
 ) -> None:
     """
     Export results to a R2 bucket following the PFB calver convention.
@@ -160,7 +206,11 @@ def r2(
                 country,
                 city,
                 region,
+                formats=with_formats or common.DEFAULT_EXPORT_FORMATS,
                 with_bundle=with_bundle,
+                bundle_compression=bundle_compression,
+                profile=profile,
+                delta=delta,
             )
         )
 
@@ -173,8 +223,11 @@ def r2_custom(
     secret_access_key: R2SecretAccessKey,  # noqa: ARG001
     bucket_name: str,
     s3_dir: pathlib.Path = pathlib.Path(),
+    with_formats: common.ExportFormats = common.DEFAULT_EXPORT_FORMATS,
     *,
     with_bundle: bool = False,
+    bundle_compression: common.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: common.ExportProfile = constant.ExportProfile.FULL,
 ) -> None:
     """
     Export results to a custom R2 bucket.
@@ -186,7 +239,15 @@ def r2_custom(
     """
     with console.status("[green]Uploading results to Cloudflare R2..."):
         asyncio.run(
-            r2_custom_(database_url, bucket_name, s3_dir, with_bundle=with_bundle)
+            r2_custom_(
+                database_url,
+                bucket_name,
+                s3_dir,
+                formats=with_formats or common.DEFAULT_EXPORT_FORMATS,
+                with_bundle=with_bundle,
+                bundle_compression=bundle_compression,
+                profile=profile,
+            )
         )
 
 
@@ -194,13 +255,19 @@ def _local(
     database_url: str,
     export_dir: pathlib.Path,
     *,
+    formats: list[constant.ExportFormat] = common.DEFAULT_EXPORT_FORMATS,
     with_bundle: bool = False,
+    bundle_compression: constant.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: constant.ExportProfile = constant.ExportProfile.FULL,
 ) -> None:
     console.log(f"[green]Saving results to {export_dir}...")
     exporter.local_files(
         database_url=database_url,
         export_dir=export_dir,
+        formats=formats,
         with_bundle=with_bundle,
+        bundle_compression=bundle_compression,
+        profile=profile,
     )
 
 
@@ -211,7 +278,11 @@ async def s3_(
     city: common.City,
     region: common.Region = None,
     *,
+    formats: list[constant.ExportFormat] = common.DEFAULT_EXPORT_FORMATS,
     with_bundle: bool = False,
+    bundle_compression: constant.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: constant.ExportProfile = constant.ExportProfile.FULL,
+    delta: bool = False,
 ) -> pathlib.Path:
     """Export results to a S3 bucket following the PFB calver convention."""
     return await exporter.export_to_s3_with_calver(
@@ -220,7 +291,11 @@ async def s3_(
         country,
         city,
         region,
+        formats=formats,
         with_bundle=with_bundle,
+        bundle_compression=bundle_compression,
+        profile=profile,
+        delta=delta,
     )
 
 
@@ -229,14 +304,20 @@ async def s3_custom_(
     bucket_name: str,
     s3_dir: pathlib.Path = pathlib.Path(),
     *,
+    formats: list[constant.ExportFormat] = common.DEFAULT_EXPORT_FORMATS,
     with_bundle: bool = False,
+    bundle_compression: constant.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: constant.ExportProfile = constant.ExportProfile.FULL,
 ) -> pathlib.Path:
     """Export results to a custom directory in a S3 bucket."""
     return await exporter.export_to_s3_with_custom_dir(
         bucket_name,
         database_url,
         s3_dir,
+        formats=formats,
         with_bundle=with_bundle,
+        bundle_compression=bundle_compression,
+        profile=profile,
     )
 
 
@@ -247,7 +328,11 @@ async def r2_(
     city: common.City,
     region: common.Region = None,
     *,
+    formats: list[constant.ExportFormat] = common.DEFAULT_EXPORT_FORMATS,
     with_bundle: bool = False,
+    bundle_compression: constant.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: constant.ExportProfile = constant.ExportProfile.FULL,
+    delta: bool = False,
 ) -> pathlib.Path:
     """Export results to a R2 bucket following the PFB calver convention."""
     return await exporter.export_to_r2_with_calver(
@@ -256,7 +341,11 @@ async def r2_(
         country,
         city,
         region,
+        formats=formats,
         with_bundle=with_bundle,
+        bundle_compression=bundle_compression,
+        profile=profile,
+        delta=delta,
     )
 
 
@@ -265,12 +354,18 @@ async def r2_custom_(
     bucket_name: str,
     r2_dir: pathlib.Path = pathlib.Path(),
     *,
+    formats: list[constant.ExportFormat] = common.DEFAULT_EXPORT_FORMATS,
     with_bundle: bool = False,
+    bundle_compression: constant.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: constant.ExportProfile = constant.ExportProfile.FULL,
 ) -> pathlib.Path:
     """Export results to a custom R2 bucket."""
     return await exporter.export_to_r2_with_custom_dir(
         bucket_name,
         database_url,
         r2_dir,
+        formats=formats,
         with_bundle=with_bundle,
+        bundle_compression=bundle_compression,
+        profile=profile,
     )
@@ -22,6 +22,7 @@ def all_(
     region: common.Region = None,
     fips_code: common.FIPSCode = common.DEFAULT_CITY_FIPS_CODE,
     lodes_year: common.LODESYear = None,
+    osm_import_mode: common.OSMImportMode = common.DEFAULT_OSM_IMPORT_MODE,
 ) -> None:
     """Import all files into database."""
     # Make MyPy happy.
@@ -40,6 +41,7 @@ def all_(
             database_url=database_url,
             fips_code=fips_code,
             lodes_year=lodes_year,
+            osm_import_mode=osm_import_mode,
             region=region,
         ),
     )
@@ -96,6 +98,7 @@ def osm(
     city: common.City,
     region: common.Region = None,
     fips_code: common.FIPSCode = common.DEFAULT_CITY_FIPS_CODE,
+    osm_import_mode: common.OSMImportMode = common.DEFAULT_OSM_IMPORT_MODE,
 ) -> None:
     """Import OSM data."""
     # Make mypy happy.
@@ -110,5 +113,6 @@ def osm(
         data_dir=data_dir,
         database_url=database_url,
         fips_code=fips_code,
+        osm_import_mode=osm_import_mode,
         region=region,
     )
@@ -87,7 +87,7 @@ def prepare_cmd(
     )
 
 
-async def prepare_(  # noqa: PLR0915
+async def prepare_(  # noqa: C901, PLR0912, PLR0915
     *,
     block_population: int,
     block_size: int,
@@ -115,24 +115,18 @@ async def prepare_(  # noqa: PLR0915
     data_dir.mkdir(parents=True, exist_ok=True)
     logger.info(f"{data_dir=}")
 
-    # Prepare the caching strategy.
-    caching_strategy = datastore.CacheType.USER_CACHE
-    if no_cache:
-        caching_strategy = datastore.CacheType.NONE
-    elif cache_dir:
-        caching_strategy = datastore.CacheType.CUSTOM
-
     # Prepare the data store.
-    bna_store = datastore.BNADataStore(
-        data_dir,
-        caching_strategy,
-        mirror=mirror,
-        custom_dir=cache_dir,
+    bna_store = create_datastore(
+        data_dir, cache_dir=cache_dir, mirror=mirror, no_cache=no_cache
     )
 
     # Derive some information from the input.
     state_abbrev, state_fips, _ = analysis.derive_state_info(region)
     osm_region = region or country
+    polygon_file = data_dir / f"{slug}.geojson"
+    pfb_osm_file = pathlib.Path(f"{slug}.osm.pbf")
+    # The extract may have been prepared beforehand for a batch of cities.
+    extract_ready = analysis.read_extract_bbox(data_dir / pfb_osm_file) is not None
 
     async with aiohttp.ClientSession() as session:
         # Download the city boundaries.
@@ -147,42 +141,64 @@ async def prepare_(  # noqa: PLR0915
             )
 
         # Download the OSMregion file.
-        console.log(
-            f"[green]Fetching the OSM region file for {osm_region}...",
-        )
-        with console.status("Downloading..."):
-            region_file_name = await bna_store.download_osm_data(session, osm_region)
+        if not extract_ready:
+            console.log(
+                f"[green]Fetching the OSM region file for {osm_region}...",
+            )
+            with console.status("Downloading..."):
+                region_file_name = await bna_store.download_osm_data(
+                    session, osm_region
+                )
 
     # Reduce the osm file with osmium.
-    console.log(f"[green]Reducing the OSM file for {city} with osmium...")
-    polygon_file = data_dir / f"{slug}.geojson"
-    region_file_path = data_dir / region_file_name
-    pfb_osm_file = pathlib.Path(f"{slug}.osm")
-    analysis.prepare_city_file(data_dir, region_file_path, polygon_file, pfb_osm_file)
+    if extract_ready:
+        console.log(f"[green]Reusing the OSM file prepared for {city}...")
+    else:
+        console.log(f"[green]Reducing the OSM file for {city} with osmium...")
+        region_file_path = data_dir / region_file_name
+        analysis.prepare_city_file(
+            data_dir, region_file_path, polygon_file, pfb_osm_file
+        )
 
     # Perform some specific operations for non-US cities.
     if state_fips == runner.NON_US_STATE_FIPS:
         try:
             country_iso = pycountry.countries.search_fuzzy(country)[0].alpha_3
         except LookupError:
+            country_iso = None
+            population_key = datastore.population_cache_key(
+                polygon_file,
+                "synthetic",
+                block_population=block_population,
+                block_size=block_size,
+            )
+        else:
+            population_key = datastore.population_cache_key(
+                polygon_file, "worldpop", country=country_iso, year=worldpop_year
+            )
+
+        if await bna_store.restore_population(population_key):
+            console.log("[green]Reusing the population prepared previously...")
+        elif not country_iso:
             # Create synthetic population.
             console.log("[green]Preparing synthetic population...")
             cell_size = (block_size, block_size)
-            boundary_file = data_dir / f"{slug}.geojson"
-            city_boundaries_gdf = gpd.read_file(boundary_file)
+            city_boundaries_gdf = gpd.read_file(polygon_file)
             synthetic_population = analysis.create_synthetic_population(
                 city_boundaries_gdf, *cell_size, population=block_population
             )
             # Simulate the census blocks.
             console.log("[green]Simulating census blocks...")
             analysis.simulate_census_blocks(data_dir, synthetic_population)
+            await bna_store.save_population(population_key)
         else:
             async with aiohttp.ClientSession() as session:
                 console.log(f"[green]Fetching WorldPop ({worldpop_year}) data...")
                 with console.status("Downloading..."):
                     await bna_store.download_worldpop(
-                        session, country_iso, worldpop_year
+                        session, country_iso, worldpop_year, polygon_file
                     )
+            await bna_store.save_population(population_key)
         # Change the speed limit.
         console.log(
             f"[green]Adjusting default city speed limit to {city_speed_limit} km/h...",
@@ -228,3 +244,96 @@ async def prepare_(  # noqa: PLR0915
             console.log("[green]Fetching US census blocks (2020)...")
             with console.status("Downloading..."):
                 await bna_store.download_2020_census_blocks(session, state_fips)
+
+
+async def prepare_extracts_(
+    *,
+    cities: list[tuple[str, str, str | None, str | None]],
+    cache_dir: pathlib.Path | None,
+    data_dir: pathlib.Path,
+    mirror: str | None,
+    no_cache: bool,
+) -> None:
+    """
+    Prepare the OSM files of a batch of cities.
+
+    The cities are grouped by OSM region, and all the cities of a region are
+    extracted in a single pass over the region file.
+
+    :param cities: list of (country, city, region, fips_code)
+    """
+    console = rich.get_console()
+    regions: dict[str, list[tuple[pathlib.Path, pathlib.Path]]] = {}
+    region_files: dict[str, pathlib.Path] = {}
+
+    async with aiohttp.ClientSession() as session:
+        for country_, city, region, fips_code_ in cities:
+            # Normalize the inputs the same way the analysis does.
+            country = utils.normalize_country_name(country_)
+            fips_code = (
+                fips_code_ if utils.is_usa(country) else common.DEFAULT_CITY_FIPS_CODE
+            )
+            structured_query, text_query, slug = analysis.osmnx_query(
+                country, city, region
+            )
+            city_dir = data_dir / slug
+            city_dir.mkdir(parents=True, exist_ok=True)
+            bna_store = create_datastore(
+                city_dir, cache_dir=cache_dir, mirror=mirror, no_cache=no_cache
+            )
+
+            # Download the city boundaries.
+            console.log(f"[green]Fetching city boundaries for {city}...")
+            with console.status("Downloading..."):
+                await bna_store.download_city_boundaries(
+                    session=session,
+                    structured_query=structured_query,
+                    text_query=text_query,
+                    slug=slug,
+                    fips_code=fips_code,
+                )
+
+            # Download the OSM region file once per region.
+            osm_region = region or country
+            if osm_region not in region_files:
+                console.log(
+                    f"[green]Fetching the OSM region file for {osm_region}...",
+                )
+                with console.status("Downloading..."):
+                    region_file_name = await bna_store.download_osm_data(
+                        session, osm_region
+                    )
+                region_files[osm_region] = city_dir / region_file_name
+            regions.setdefault(osm_region, []).append(
+                (city_dir / f"{slug}.geojson", city_dir / f"{slug}.osm.pbf")
+            )
+
+    # Reduce the osm file with osmium.
+    for osm_region, extracts in regions.items():
+        console.log(
+            f"[green]Reducing the OSM file for {len(extracts)} cities "
+            f"in {osm_region} with osmium..."
+        )
+        analysis.prepare_city_files(region_files[osm_region], extracts)
+
+
+def create_datastore(
+    data_dir: pathlib.Path,
+    *,
+    cache_dir: pathlib.Path | None,
+    mirror: str | None,
+    no_cache: bool,
+) -> datastore.BNADataStore:
+    """Create the data store matching the caching options."""
+    caching_strategy = datastore.CacheType.USER_CACHE
+    if no_cache:
+        caching_strategy = datastore.CacheType.NONE
+    elif cache_dir:
+        caching_strategy = datastore.CacheType.CUSTOM
+
+    return datastore.BNADataStore(
+        data_dir,
+        caching_strategy,
+        mirror=mirror,
+        custom_dir=cache_dir,
+    )
@@ -35,6 +35,7 @@ def run(
     lodes_year: common.LODESYear = None,
     max_trip_distance: common.MaxTripDistance = common.DEFAULT_MAX_TRIP_DISTANCE,
     mirror: common.Mirror = None,
+    osm_import_mode: common.OSMImportMode = common.DEFAULT_OSM_IMPORT_MODE,
     s3_bucket: Annotated[
         str | None,
         typer.Option(help="S3 bucket name where to export"),
@@ -64,6 +65,7 @@ def run(
             max_trip_distance=max_trip_distance,
             mirror=mirror,
             no_cache=no_cache,
+            osm_import_mode=osm_import_mode,
             region=region,
             s3_bucket=s3_bucket,
             s3_dir=s3_dir,
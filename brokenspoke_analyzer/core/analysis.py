@@ -1,9 +1,9 @@
 """Define functions used to perform an analysis."""
 
+import json
 import os
 import pathlib
-import random
-import string
+import tempfile
 import warnings
 import zipfile
 
@@ -71,6 +71,112 @@ def prepare_city_file(
             region_file_path.resolve(),
             pfb_osm_file_path.resolve(),
         )
+    if read_extract_bbox(pfb_osm_file_path) is None:
+        write_extract_metadata(pfb_osm_file_path)
+
+
+def prepare_city_files(
+    region_file_path: pathlib.Path,
+    extracts: list[tuple[pathlib.Path, pathlib.Path]],
+) -> None:
+    """
+    Prepare the OSM files for several cities of the same region at once.
+
+    The region file is read only once, no matter the number of cities.
+
+    :param region_file_path: OSM file of the region containing the cities
+    :param extracts: list of (boundary file, OSM file) to produce
+    """
+    missing = [
+        (boundary_file_path, pfb_osm_file_path)
+        for boundary_file_path, pfb_osm_file_path in extracts
+        if not pfb_osm_file_path.exists()
+    ]
+    if missing:
+        config = {
+            "extracts": [
+                {
+                    "output": str(pfb_osm_file_path.resolve()),
+                    "polygon": {
+                        "file_name": str(boundary_file_path.resolve(strict=True)),
+                        "file_type": "geojson",
+                    },
+                }
+                for boundary_file_path, pfb_osm_file_path in missing
+            ]
+        }
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config_file_path = pathlib.Path(tmpdir) / "extracts.json"
+            config_file_path.write_text(json.dumps(config))
+            runner.run_osmium_extract_config(config_file_path, region_file_path)
+    for _, pfb_osm_file_path in extracts:
+        if read_extract_bbox(pfb_osm_file_path) is None:
+            write_extract_metadata(pfb_osm_file_path)
+
+
+def extract_metadata_file(osm_file: pathlib.Path) -> pathlib.Path:
+    """
+    Return the path of the sidecar file describing an OSM extract.
+
+    Example:
+        >>> extract_metadata_file(pathlib.Path("data/valletta-malta.osm.pbf"))
+        PosixPath('data/valletta-malta.osm.pbf.json')
+    """
+    return osm_file.with_name(f"{osm_file.name}.json")
+
+
+def write_extract_metadata(osm_file: pathlib.Path) -> None:
+    """
+    Record the boundary box of the data of an OSM extract.
+
+    The ways crossing the boundaries are kept complete, therefore the data
+    extends past the polygon used to extract it. The box is expressed in
+    EPSG:4326, like the OSM data.
+    """
+    fileinfo = runner.run_osmium_fileinfo(osm_file)
+    metadata = {"data_bbox": fileinfo["data"].get("bbox")}
+    extract_metadata_file(osm_file).write_text(json.dumps(metadata))
+
+
+def read_extract_bbox(
+    osm_file: pathlib.Path,
+) -> tuple[float, float, float, float] | None:
+    """
+    Read the boundary box of the data of an OSM extract from its sidecar file.
+
+    Returns None if the extract was not described by the prepare phase, or if
+    it does not contain any data.
+    """
+    metadata_file = extract_metadata_file(osm_file)
+    if not metadata_file.exists():
+        return None
+    data_bbox = json.loads(metadata_file.read_text()).get("data_bbox")
+    if not data_bbox:
+        return None
+    xmin, ymin, xmax, ymax = data_bbox
+    return (xmin, ymin, xmax, ymax)
+
+
+def bbox_within(
+    inner: tuple[float, float, float, float],
+    outer: tuple[float, float, float, float],
+) -> bool:
+    """
+    Return True if the `inner` boundary box is contained in the `outer` one.
+
+    Examples:
+        >>> bbox_within((1, 1, 2, 2), (0, 0, 3, 3))
+        True
+
+        >>> bbox_within((1, 1, 4, 2), (0, 0, 3, 3))
+        False
+    """
+    return (
+        inner[0] >= outer[0]
+        and inner[1] >= outer[1]
+        and inner[2] <= outer[2]
+        and inner[3] <= outer[3]
+    )
 
 
 def state_info(state: str) -> tuple[str, str]:
@@ -161,44 +267,31 @@ def create_synthetic_population(
 
     # Prepare the rows and columns.
     xmin, ymin, xmax, ymax = mercator_area.total_bounds
-    cols = list(np.arange(xmin, xmax + width, width))
-    rows = list(np.arange(ymin, ymax + length, length))
+    cols = np.arange(xmin, xmax + width, width)[:-1]
+    rows = np.arange(ymin, ymax + length, length)[:-1]
 
     # Extract all the boundaries.
     boundaries = mercator_area.geometry.explode(index_parts=True)
 
-    # Compute the cells.
-    cells = []
-    for col in cols[:-1]:
-        for row in rows[:-1]:
-            # Create a new grid cell.
-            cell = shapely.geometry.Polygon(
-                [
-                    (col, row),
-                    (col + width, row),
-                    (col + width, row + length),
-                    (col, row + length),
-                ],
-            )
-
-            # Append it if it intersects with the biggest region.
-            if any(map(cell.intersects, boundaries)):
-                cells.append(cell)
+    # Compute the cells, column by column.
+    xs, ys = np.meshgrid(cols, rows, indexing="ij")
+    grid_cells = shapely.box(xs, ys, xs + width, ys + length).ravel()
+
+    # Keep the cells intersecting with any of the boundaries.
+    tree = shapely.STRtree(grid_cells)
+    _, cell_indices = tree.query(boundaries.to_numpy(), predicate="intersects")
+    cell_indices = np.unique(cell_indices)
+    cells = grid_cells[cell_indices]
 
     # Create a geodataframe made of the cells overlapping with the area.
-    # Add new columns to simulate US census data.
-    blockid_len = 15
+    # Add new columns to simulate US census data, deriving the block IDs from the
+    # position of the cells in the grid.
+    col_indices, row_indices = np.divmod(cell_indices, len(rows))
     grid = gpd.GeoDataFrame(
         {
             "geometry": cells,
             "POP20": population,
-            "GEOID20": [
-                "".join(
-                    random.choice(string.ascii_lowercase)  # noqa: S311
-                    for x in range(blockid_len)
-                )
-                for _ in range(len(cells))
-            ],
+            "GEOID20": utils.synthetic_geoid20(col_indices, row_indices),
         },
         crs=utils.PSEUDO_MERCATOR_CRS,
     )  # ty:ignore[no-matching-overload]
@@ -0,0 +1,433 @@
+"""Define functions to process batches of cities."""
+
+import bisect
+import concurrent.futures
+import dataclasses
+import json
+import pathlib
+import sqlite3
+import time
+import typing
+from datetime import (
+    UTC,
+    datetime,
+)
+
+import geopandas as gpd
+from loguru import logger
+
+from brokenspoke_analyzer.core import (
+    analysis,
+    constant,
+)
+from brokenspoke_analyzer.core.database import dbcore
+
+# Number of database cores dedicated to the analysis of a city.
+CORES_PER_CITY = 2
+
+# Maximum number of database connections of a city: its connection pool, and the
+# client tools like osm2pgsql.
+CONNECTIONS_PER_CITY = dbcore.POOL_SIZE + dbcore.POOL_MAX_OVERFLOW + 4
+
+# Relative cost of processing a city of a given size.
+SIZE_COSTS = {
+    constant.CitySize.XS: 1,
+    constant.CitySize.S: 2,
+    constant.CitySize.M: 4,
+    constant.CitySize.L: 8,
+    constant.CitySize.XL: 16,
+    constant.CitySize.XXL: 32,
+}
+
+# Upper bounds of the OSM extract sizes (in MB) of each size class but the last.
+EXTRACT_SIZE_BOUNDS = [1, 5, 20, 50, 200]
+
+# Upper bounds of the boundary areas (in km²) of each size class but the last.
+BOUNDARY_AREA_BOUNDS = [10, 50, 200, 500, 1500]
+
+# Number of workers of the pipeline phases not bounded by the database cores.
+PHASE_WORKERS = {
+    constant.Phase.PREPARE: 2,
+    constant.Phase.IMPORT: 1,
+    constant.Phase.EXPORT: 2,
+}
+
+# Delay (in seconds) before retrying a failed city for the first time.
+RETRY_BACKOFF = 60
+
+# Schema of the batch ledger.
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cities (
+    country TEXT NOT NULL,
+    region TEXT NOT NULL,
+    city TEXT NOT NULL,
+    fips_code TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    output TEXT,
+    timings TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (country, region, city)
+)
+"""
+
+
+@dataclasses.dataclass(frozen=True)
+class BatchCity:
+    """Define a city of a batch."""
+
+    country: str
+    city: str
+    region: str
+    fips_code: str
+    size: constant.CitySize = constant.CitySize.M
+
+
+def default_workers(
+    cores: int,
+    max_connections: int,
+    *,
+    pipeline: bool = False,
+) -> int:
+    """
+    Compute the number of cities to process concurrently on a database server.
+
+    The cities are bounded by the cores of the server, and by its connections as
+    each city opens its own. The batch itself is given the connections of a
+    city, and in a pipeline the cities being imported and exported hold theirs
+    too.
+
+    Examples:
+        >>> default_workers(8, 100)
+        4
+        >>> default_workers(64, 100)
+        4
+        >>> default_workers(64, 400, pipeline=True)
+        16
+        >>> default_workers(1, 100)
+        1
+    """
+    cities = max_connections // CONNECTIONS_PER_CITY - 1
+    if pipeline:
+        cities -= PHASE_WORKERS[constant.Phase.IMPORT]
+        cities -= PHASE_WORKERS[constant.Phase.EXPORT]
+    return max(1, min(cores // CORES_PER_CITY, cities))
+
+
+def classify(value: float, bounds: typing.Sequence[float]) -> constant.CitySize:
+    """
+    Classify a value into a size class given the upper bounds of the classes.
+
+    Examples:
+        >>> classify(0.5, EXTRACT_SIZE_BOUNDS)
+        <CitySize.XS: 'XS'>
+        >>> classify(30, EXTRACT_SIZE_BOUNDS)
+        <CitySize.L: 'L'>
+        >>> classify(1000, EXTRACT_SIZE_BOUNDS)
+        <CitySize.XXL: 'XXL'>
+    """
+    return list(constant.CitySize)[bisect.bisect_left(bounds, value)]
+
+
+def estimate_size(
+    country: str,
+    city: str,
+    region: str | None,
+    data_dir: pathlib.Path,
+) -> constant.CitySize:
+    """
+    Estimate the size of a city from its prepared input files.
+
+    The size of the OSM extract is the best estimate, followed by the area of the
+    city boundary. Without any of these files, the city is assumed to be medium.
+    """
+    _, _, slug = analysis.osmnx_query(country, city, region)
+    osm_file = data_dir / slug / f"{slug}.osm.pbf"
+    if osm_file.exists():
+        return classify(osm_file.stat().st_size / 1024**2, EXTRACT_SIZE_BOUNDS)
+    boundary_file = data_dir / slug / f"{slug}.shp"
+    if boundary_file.exists():
+        gdf = gpd.read_file(boundary_file)
+        area = gdf.to_crs(gdf.estimate_utm_crs()).area.sum() / 1e6
+        return classify(area, BOUNDARY_AREA_BOUNDS)
+    logger.debug(f"no input files to estimate the size of {slug}")
+    return constant.CitySize.M
+
+
+def next_phase(phase: constant.Phase) -> constant.Phase | None:
+    """
+    Return the phase following `phase`, or `None` if it is the last one.
+
+    Examples:
+        >>> next_phase(constant.Phase.IMPORT)
+        <Phase.COMPUTE: 'compute'>
+        >>> next_phase(constant.Phase.EXPORT) is None
+        True
+    """
+    phases = list(constant.Phase)
+    index = phases.index(phase) + 1
+    return phases[index] if index < len(phases) else None
+
+
+def weight(size: constant.CitySize, budget: int) -> int:
+    """
+    Compute the share of the concurrency budget used by a city.
+
+    The largest cities use the whole budget, so that two of them never share the
+    database server, and the smallest ones use a single slot.
+
+    Examples:
+        >>> [weight(size, 8) for size in constant.CitySize]
+        [1, 1, 1, 2, 4, 8]
+    """
+    cost = SIZE_COSTS[size]
+    largest = SIZE_COSTS[constant.CitySize.XXL]
+    return max(1, min(budget, budget * cost // largest))
+
+
+def server_share(size: constant.CitySize, budget: int) -> float:
+    """
+    Compute the share of the database server given to a city.
+
+    Examples:
+        >>> server_share(constant.CitySize.M, 4)
+        0.25
+        >>> server_share(constant.CitySize.XXL, 4)
+        1.0
+    """
+    return weight(size, budget) / budget
+
+
+def longest_first(cities: typing.Iterable[BatchCity]) -> list[BatchCity]:
+    """Sort the cities from the most to the least expensive to process."""
+    return sorted(cities, key=lambda city: SIZE_COSTS[city.size], reverse=True)
+
+
+def next_cities(
+    pending: typing.Sequence[BatchCity],
+    available: int,
+    budget: int,
+) -> list[BatchCity]:
+    """
+    Select the pending cities to start within the available budget.
+
+    The cities are considered in order, therefore sorting them longest first lets
+    the largest ones start as soon as possible while the smaller ones fill the
+    remaining slots.
+    """
+    selected = []
+    for city in pending:
+        city_weight = weight(city.size, budget)
+        if city_weight <= available:
+            selected.append(city)
+            available -= city_weight
+    return selected
+
+
+def backoff(attempt: int) -> int:
+    """
+    Compute the delay (in seconds) before retrying a city after a failed attempt.
+
+    Examples:
+        >>> [backoff(attempt) for attempt in range(1, 4)]
+        [60, 120, 240]
+    """
+    return RETRY_BACKOFF * 2 ** (attempt - 1)
+
+
+def retry_timeout(
+    retry_at: typing.Mapping[BatchCity, float],
+    pending: typing.Iterable[BatchCity],
+    now: float,
+) -> float | None:
+    """
+    Compute the time to wait for the next retry of the pending cities to be due.
+
+    The retries already due are left out: they wait for a slot to be released,
+    not for a delay to elapse. Returns None if no retry is upcoming.
+
+    Examples:
+        >>> city = BatchCity("united states", "austin", "texas", "4805000")
+        >>> retry_timeout({city: 90.0}, [city], now=30.0)
+        60.0
+        >>> retry_timeout({city: 10.0}, [city], now=30.0) is None
+        True
+    """
+    delays = [retry_at[city] - now for city in pending if retry_at.get(city, now) > now]
+    return min(delays, default=None)
+
+
+def wait_for_progress(
+    running: typing.Collection[concurrent.futures.Future],
+    retry_at: typing.Mapping[BatchCity, float],
+    pending: typing.Iterable[BatchCity],
+) -> set[concurrent.futures.Future]:
+    """
+    Wait for a running task to complete, or for the next retry to be due.
+
+    The pending cities whose retry is already due wait for a running task to
+    release its slot. Returns the completed tasks.
+    """
+    timeout = retry_timeout(retry_at, pending, time.monotonic())
+    done, _ = concurrent.futures.wait(
+        running,
+        timeout=timeout,
+        return_when=concurrent.futures.FIRST_COMPLETED,
+    )
+    if not running and timeout:
+        time.sleep(timeout)
+    return done
+
+
+def ledger_path(export_dir: pathlib.Path) -> pathlib.Path:
+    """
+    Return the path of the ledger of a batch exported into `export_dir`.
+
+    Examples:
+        >>> ledger_path(pathlib.Path("results"))
+        PosixPath('results.sqlite')
+    """
+    return export_dir.with_suffix(".sqlite")
+
+
+class Ledger:
+    """
+    Record the outcome of each city of a batch into a SQLite database.
+
+    The ledger outlives the batch, allowing an interrupted batch to be resumed,
+    or its failed cities to be retried.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        """Open the ledger, creating it if needed."""
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(LEDGER_SCHEMA)
+
+    def __enter__(self) -> typing.Self:
+        """Enter the context."""
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        """Close the ledger."""
+        self.connection.close()
+
+    def _update(self, city: BatchCity, **columns: typing.Any) -> None:
+        """Update the columns of the record of a city."""
+        columns["updated_at"] = datetime.now(tz=UTC).isoformat()
+        assignments = ", ".join(f"{column} = :{column}" for column in columns)
+        with self.connection:
+            self.connection.execute(
+                f"UPDATE cities SET {assignments} "
+                "WHERE country = :country AND region = :region AND city = :city",
+                {
+                    **columns,
+                    "country": city.country,
+                    "region": city.region,
+                    "city": city.city,
+                },
+            )
+
+    def register(self, cities: typing.Iterable[BatchCity]) -> None:
+        """Add the cities which are not recorded yet as pending."""
+        now = datetime.now(tz=UTC).isoformat()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO cities "
+                "(country, region, city, fips_code, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        city.country,
+                        city.region,
+                        city.city,
+                        city.fips_code,
+                        constant.BatchStatus.PENDING,
+                        now,
+                    )
+                    for city in cities
+                ],
+            )
+
+    def status(self, city: BatchCity) -> constant.BatchStatus | None:
+        """Return the status of a city, or `None` if it is not recorded."""
+        row = self.connection.execute(
+            "SELECT status FROM cities WHERE country = ? AND region = ? AND city = ?",
+            (city.country, city.region, city.city),
+        ).fetchone()
+        return constant.BatchStatus(row[0]) if row else None
+
+    def select(
+        self,
+        cities: typing.Iterable[BatchCity],
+        *,
+        resume: bool = False,
+        retry_failed: bool = False,
+    ) -> list[BatchCity]:
+        """
+        Select the cities to process.
+
+        When resuming, the cities which already succeeded are skipped, and the
+        failed ones too unless they must be retried. When only retrying the failed
+        cities, all the other ones are skipped. Otherwise all the cities are
+        processed again.
+        """
+        if not resume and not retry_failed:
+            return list(cities)
+        skipped = {constant.BatchStatus.SUCCEEDED}
+        if not retry_failed:
+            skipped.add(constant.BatchStatus.FAILED)
+        selected = []
+        for city in cities:
+            status = self.status(city)
+            if retry_failed and not resume:
+                if status == constant.BatchStatus.FAILED:
+                    selected.append(city)
+            elif status not in skipped:
+                selected.append(city)
+        return selected
+
+    def attempts(self, city: BatchCity) -> int:
+        """Return the number of attempts made to process a city."""
+        row = self.connection.execute(
+            "SELECT attempts FROM cities WHERE country = ? AND region = ? AND city = ?",
+            (city.country, city.region, city.city),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def start(self, city: BatchCity) -> None:
+        """Record a new attempt to process a city."""
+        self._update(
+            city,
+            status=constant.BatchStatus.RUNNING,
+            attempts=self.attempts(city) + 1,
+            error=None,
+        )
+
+    def succeed(
+        self,
+        city: BatchCity,
+        output: pathlib.Path | None,
+        timings: dict[str, float],
+    ) -> None:
+        """Record the successful processing of a city."""
+        self._update(
+            city,
+            status=constant.BatchStatus.SUCCEEDED,
+            output=str(output) if output else None,
+            timings=json.dumps(timings),
+        )
+
+    def fail(
+        self,
+        city: BatchCity,
+        error: str,
+        timings: dict[str, float] | None = None,
+    ) -> None:
+        """Record the failure to process a city."""
+        self._update(
+            city,
+            status=constant.BatchStatus.FAILED,
+            error=error,
+            timings=json.dumps(timings) if timings is not None else None,
+        )
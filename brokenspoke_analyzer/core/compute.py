@@ -276,8 +276,14 @@ def connectivity(  # noqa: PLR0915
     max_trip_distance: int | None = common.DEFAULT_MAX_TRIP_DISTANCE,
     *,
     import_jobs: bool,
+    unlogged: bool = False,
 ) -> None:
-    """Compute BNA connectivity scores."""
+    """
+    Compute BNA connectivity scores.
+
+    The intermediate tables are created as `UNLOGGED` if `unlogged` is set,
+    skipping the WAL at the cost of being emptied after a crash.
+    """
     # Makes MyPy happy.
     if not max_trip_distance:
         raise ValueError("`max_trip_distance` must be set")
@@ -293,22 +299,26 @@ def connectivity(  # noqa: PLR0915
     sql_connectivity_script_dir = sql_script_dir / "connectivity"
 
     # Building network.
+    # Building the network and the blocks is mostly about creating indexes.
     logger.info("BUILDING: Building network")
-    sql_script = sql_connectivity_script_dir / "build_network.sql"
-    bind_params = {"nb_output_srid": output_srid}
-    execute_sqlfile_with_substitutions(engine, sql_script, bind_params)
+    with dbcore.workload(engine, constant.Workload.LOAD):
+        sql_script = sql_connectivity_script_dir / "build_network.sql"
+        bind_params = {"nb_output_srid": output_srid}
+        execute_sqlfile_with_substitutions(engine, sql_script, bind_params)
 
-    sql_script = sql_connectivity_script_dir / "census_blocks.sql"
-    bind_params = {
-        "block_road_buffer": block_road.buffer,
-        "block_road_min_length": block_road.min_length,
-        "nb_output_srid": output_srid,
-    }
-    execute_sqlfile_with_substitutions(engine, sql_script, bind_params)
+        sql_script = sql_connectivity_script_dir / "census_blocks.sql"
+        bind_params = {
+            "block_road_buffer": block_road.buffer,
+            "block_road_min_length": block_road.min_length,
+            "nb_output_srid": output_srid,
+        }
+        execute_sqlfile_with_substitutions(engine, sql_script, bind_params)
 
-    # Build the temporary block verts for reachable roads calc
-    logger.info("CONNECTIVITY: Block verts")
-    dbcore.execute_sql_file(engine, sql_connectivity_script_dir / "block_verts.sql")
+        # Build the temporary block verts for reachable roads calc
+        logger.info("CONNECTIVITY: Block verts")
+        persistence = {"nb_unlogged": "UNLOGGED" if unlogged else ""}
+        sql_script = sql_connectivity_script_dir / "block_verts.sql"
+        execute_sqlfile_with_substitutions(engine, sql_script, persistence)
 
     # Reachable roads stress.
     for stress_level in ["high", "low"]:
@@ -320,7 +330,7 @@ def connectivity(  # noqa: PLR0915
             sql_connectivity_script_dir
             / f"reachable_roads_{stress_level}_stress_prep.sql"
         )
-        dbcore.execute_sql_file(engine, sql_script)
+        execute_sqlfile_with_substitutions(engine, sql_script, persistence)
 
         # Calculations
         logger.info(f"Reachable roads {stress_level} stress: calculations")
@@ -355,6 +365,7 @@ def connectivity(  # noqa: PLR0915
     bind_params = {
         "nb_max_trip_distance": max_trip_distance,
         "nb_output_srid": output_srid,
+        **persistence,
     }
     execute_sqlfile_with_substitutions(engine, sql_script, bind_params)
 
@@ -555,34 +566,39 @@ def parts(
         logger.info("no compute action was specified")
 
     # Prepare the database connection.
-    engine = dbcore.create_psycopg_engine(database_url)
+    engine = dbcore.get_engine(database_url)
 
     # Compute features.
     # Features are required to compute ALL the other parts, therefore are being
     # run every time.
     logger.info("Compute features")
-    features(engine, sql_script_dir, output_srid, buffer)
+    with dbcore.workload(engine, constant.Workload.UPDATES):
+        features(engine, sql_script_dir, output_srid, buffer)
 
     # Compute stress.
     if constant.ComputePart.STRESS in compute_parts:
         logger.info("Compute stress")
-        stress(
-            engine,
-            sql_script_dir,
-            state_default_speed,
-            city_default_speed,
-        )
+        with dbcore.workload(engine, constant.Workload.UPDATES):
+            stress(
+                engine,
+                sql_script_dir,
+                state_default_speed,
+                city_default_speed,
+            )
 
     # Compute connectivity.
     if constant.ComputePart.CONNECTIVITY in compute_parts:
         logger.info("Compute connectivity")
-        connectivity(
-            engine,
-            sql_script_dir,
-            output_srid,
-            max_trip_distance,
-            import_jobs=import_jobs,
-        )
+        durability = dbcore.current_durability(engine)
+        with dbcore.workload(engine, constant.Workload.ANALYTICS):
+            connectivity(
+                engine,
+                sql_script_dir,
+                output_srid,
+                max_trip_distance,
+                import_jobs=import_jobs,
+                unlogged=durability != constant.Durability.DURABLE,
+            )
 
     # Compute mileage.
     if constant.ComputePart.MEASURE in compute_parts:
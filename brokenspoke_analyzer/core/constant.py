@@ -6,6 +6,17 @@ APPNAME = "brokenspoke-analyzer"
 APPAUTHOR = "PeopleForBikes"
 
 
+class CitySize(enum.StrEnum):
+    """Define the size classes of the cities, from the smallest to the largest."""
+
+    XS = "XS"
+    S = "S"
+    M = "M"
+    L = "L"
+    XL = "XL"
+    XXL = "XXL"
+
+
 class ComputePart(enum.StrEnum):
     """Define the possible items to compute."""
 
@@ -15,5 +26,73 @@ class ComputePart(enum.StrEnum):
     MEASURE = "measure"
 
 
+class BatchStatus(enum.StrEnum):
+    """Define the status of a city in a batch."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class BundleCompression(enum.StrEnum):
+    """Define the compression methods available to bundle the exported files."""
+
+    STORED = "stored"
+    DEFLATE = "deflate"
+    LZMA = "lzma"
+
+
+class Durability(enum.StrEnum):
+    """Define the durability profiles of the database."""
+
+    DURABLE = "durable"
+    SCRATCH = "scratch"
+    DISPOSABLE = "disposable"
+
+
+class ExportFormat(enum.StrEnum):
+    """Define the file formats the tables can be exported to."""
+
+    SHP = "shp"
+    GEOJSON = "geojson"
+    CSV = "csv"
+    PARQUET = "parquet"
+    FGB = "fgb"
+
+
+class ExportProfile(enum.StrEnum):
+    """Define the profiles selecting the data to export."""
+
+    FULL = "full"
+    SCORES = "scores"
+    WEB = "web"
+
+
+class Phase(enum.StrEnum):
+    """Define the phases of an analysis."""
+
+    PREPARE = "prepare"
+    IMPORT = "import"
+    COMPUTE = "compute"
+    EXPORT = "export"
+
+
+class Workload(enum.StrEnum):
+    """Define the kinds of workload the database is tuned for."""
+
+    LOAD = "load"
+    ANALYTICS = "analytics"
+    UPDATES = "updates"
+
+
+class OSMImportMode(enum.StrEnum):
+    """Define the strategies available to import the OSM data."""
+
+    SPLIT = "split"
+    CONSOLIDATED = "consolidated"
+
+
 COMPUTE_PARTS_ALL = list(ComputePart)
+EXPORT_FORMATS_DEFAULT = [ExportFormat.SHP, ExportFormat.GEOJSON, ExportFormat.CSV]
 GDF_CLASS_BOUNDARY = "boundary"
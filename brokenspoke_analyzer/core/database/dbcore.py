@@ -1,20 +1,96 @@
 """Define functions used to manipulate database data."""
 
+import contextlib
+import contextvars
+import dataclasses
+import functools
+import hashlib
+import math
+import os
 import pathlib
+import re
+import threading
 import typing
 
+from loguru import logger
 from sqlalchemy import (
     create_engine,
     text,
 )
-from sqlalchemy.engine import Engine
+from sqlalchemy.engine import (
+    Engine,
+    make_url,
+)
+from sqlalchemy.exc import DBAPIError
 
-from brokenspoke_analyzer.core import runner
+from brokenspoke_analyzer.core import (
+    constant,
+    runner,
+)
+
+# Maximum length of a PostgreSQL identifier.
+MAX_IDENTIFIER_LENGTH = 63
+
+# Name of the template database the analysis databases are created from.
+TEMPLATE_DATABASE = "bna_template"
+
+# Files describing the resources of a Linux host, and the limits of its control
+# group.
+CPU_ONLINE_FILE = "/sys/devices/system/cpu/online"
+MEMINFO_FILE = "/proc/meminfo"
+CGROUP_CPU_MAX_FILE = "/sys/fs/cgroup/cpu.max"
+CGROUP_MEMORY_MAX_FILE = "/sys/fs/cgroup/memory.max"
+
+# Hosts of a database server running on the local machine.
+LOCAL_HOSTS = {None, "", "localhost", "127.0.0.1", "::1"}
+
+# Scales of the units of the PostgreSQL settings, to bytes or milliseconds.
+SETTING_UNITS = {
+    "B": 1,
+    "kB": 1024,
+    "MB": 1024**2,
+    "GB": 1024**3,
+    "TB": 1024**4,
+    "us": 0.001,
+    "ms": 1,
+    "s": 1000,
+    "min": 60 * 1000,
+    "h": 60 * 60 * 1000,
+    "d": 24 * 60 * 60 * 1000,
+}
+
+# Size of the connection pools, covering the concurrent exports.
+POOL_SIZE = 8
+POOL_MAX_OVERFLOW = 8
+
+# Engines shared by the whole process, per database URL.
+_ENGINES: dict[str, Engine] = {}
+_ENGINES_LOCK = threading.Lock()
+
+# Session settings of the current workload.
+_SESSION_SETTINGS: contextvars.ContextVar[typing.Mapping[str, str] | None] = (
+    contextvars.ContextVar("session_settings", default=None)
+)
+
+# Share of the server resources the workloads of the current analysis are sized
+# for, as several analyses may run concurrently on the same server.
+_SERVER_SHARE: contextvars.ContextVar[float] = contextvars.ContextVar(
+    "server_share", default=1.0
+)
 
 
 def execute_query(engine: Engine, query: str) -> None:
-    """Execute a query and commit it."""
+    """
+    Execute a query and commit it.
+
+    The settings of the current workload are applied to the transaction.
+    """
     with engine.begin() as conn:
+        for name, value in (_SESSION_SETTINGS.get() or {}).items():
+            conn.execute(
+                text("SELECT set_config(:name, :value, true);"),
+                {"name": name, "value": value},
+            )
         conn.execute(text(query))
 
 
@@ -62,17 +138,36 @@ def load_csv_file(
     import_csv_file_with_header(engine, csvfile, table)
 
 
-def export_to_csv(engine: Engine, csvfile: pathlib.Path, table: str) -> None:
-    """Dump the table content into a CSV file."""
-    csvfile_str = sanitize_sql_filename(str(csvfile.resolve()))
-    psql_cmd = f"\\copy {table} TO '{csvfile_str}' WITH (FORMAT CSV, HEADER);"
-    database_url = engine.engine.url.set(drivername="postgresql").render_as_string(
-        hide_password=False,
-    )
-    runner.run_psql_command_string(database_url, psql_cmd)
-
+def export_to_csv(
+    engine: Engine,
+    csvfile: pathlib.Path,
+    table: str,
+    query: str | None = None,
+) -> None:
+    """
+    Dump the table content into a CSV file.
 
-def configure_db(engine: Engine, cores: int, memory_mb: int, pguser: str) -> None:
+    The data is streamed from the server with `COPY ... TO STDOUT`. If specified,
+    the result of `query` is dumped instead of the whole table.
+    """
+    source = f"({query})" if query else table
+    copy_query = f"COPY {source} TO STDOUT WITH (FORMAT CSV, HEADER)"
+    with engine.connect() as conn, csvfile.open("wb") as f:
+        driver_connection = conn.connection.driver_connection
+        if driver_connection is None:
+            raise ValueError("the database connection is closed")
+        with driver_connection.cursor().copy(copy_query) as copy:
+            for data in copy:
+                f.write(data)
+
+
+def configure_db(
+    engine: Engine,
+    cores: int,
+    memory_mb: int,
+    pguser: str,
+    durability: constant.Durability = constant.Durability.DURABLE,
+) -> None:
     """
     Configure the database.
 
@@ -80,12 +175,15 @@ def configure_db(engine: Engine, cores: int, memory_mb: int, pguser: str) -> Non
 
     This function is idempotent.
     """
-    configure_system(engine, cores, memory_mb)
+    configure_system(engine, cores, memory_mb, durability)
     configure_extensions(engine)
     configure_schemas(engine, pguser)
 
 
-def configure_docker_db(engine: Engine) -> None:
+def configure_docker_db(
+    engine: Engine,
+    durability: constant.Durability = constant.Durability.DURABLE,
+) -> None:
     """Configure a database running in Docker."""
     database_url = engine.engine.url
     pguser = database_url.username
@@ -94,12 +192,57 @@ def configure_docker_db(engine: Engine) -> None:
     docker_info = runner.run_docker_info()
     docker_cores = docker_info["NCPU"]
     docker_memory_mb = docker_info["MemTotal"] // (1024**2)
-    configure_db(engine, docker_cores, docker_memory_mb, pguser)
+    configure_db(engine, docker_cores, docker_memory_mb, pguser, durability)
 
 
-def create_psycopg_engine(database_url: str) -> Engine:
+def create_psycopg_engine(database_url: str, **kwargs: typing.Any) -> Engine:
     """Create a SQLAlchemy engine with the psycopg3 driver."""
-    return create_engine(database_url.replace("postgresql://", "postgresql+psycopg://"))
+    return create_engine(
+        database_url.replace("postgresql://", "postgresql+psycopg://"), **kwargs
+    )
+
+
+def get_engine(database_url: str) -> Engine:
+    """
+    Retrieve the engine of a database, creating it on first use.
+
+    The engines are shared by the whole process to reuse their connections.
+    Their pool is sized for the concurrent exports, and checks the connections
+    before handing them out, as the databases of a batch come and go.
+    """
+    with _ENGINES_LOCK:
+        if database_url not in _ENGINES:
+            _ENGINES[database_url] = create_psycopg_engine(
+                database_url,
+                pool_size=POOL_SIZE,
+                max_overflow=POOL_MAX_OVERFLOW,
+                pool_pre_ping=True,
+            )
+        return _ENGINES[database_url]
+
+
+def dispose_engine(database_url: str) -> None:
+    """Close the connections of the engine of a database, and forget it."""
+    with _ENGINES_LOCK:
+        engine = _ENGINES.pop(database_url, None)
+    if engine:
+        engine.dispose()
+
+
+def _reset_engines() -> None:
+    """
+    Forget the engines inherited from the parent process.
+
+    Their connections belong to the parent, therefore they are left open.
+    """
+    global _ENGINES_LOCK  # noqa: PLW0603
+    _ENGINES_LOCK = threading.Lock()
+    for engine in _ENGINES.values():
+        engine.dispose(close=False)
+    _ENGINES.clear()
+
+
+os.register_at_fork(after_in_child=_reset_engines)
 
 
 def execute_with_autocommit(engine: Engine, statements: typing.Sequence[str]) -> None:
@@ -109,33 +252,116 @@ def execute_with_autocommit(engine: Engine, statements: typing.Sequence[str]) ->
             conn.execute(text(statement))
 
 
-def configure_system(engine: Engine, cores: int, memory_mb: int) -> None:
+def configure_system(
+    engine: Engine,
+    cores: int,
+    memory_mb: int,
+    durability: constant.Durability = constant.Durability.DURABLE,
+) -> None:
     """
     Configure the system parameters.
 
+    The parameters are set to the recommended settings, and the configuration
+    is reloaded. Some of them only take effect after a restart though, which
+    `check_settings` reports.
+
     This requires elevated permissions.
     """
+    settings = recommended_settings(cores, memory_mb, durability)
     statements = [
-        f"ALTER SYSTEM SET shared_buffers TO '{memory_mb // 4}MB';",
-        f"ALTER SYSTEM SET effective_cache_size TO '{3 * memory_mb // 4}MB';",
-        f"ALTER SYSTEM SET work_mem TO '{8 * memory_mb // 1024}MB';",
-        f"ALTER SYSTEM SET maintenance_work_mem TO '{memory_mb // 16}MB';",
-        f"ALTER SYSTEM SET min_wal_size TO '{memory_mb // 8}MB';",
-        f"ALTER SYSTEM SET max_wal_size TO '{memory_mb // 2}MB';",
-        "ALTER SYSTEM SET checkpoint_completion_target TO '0.9';",
-        "ALTER SYSTEM SET wal_buffers TO '-1';",
-        "ALTER SYSTEM SET listen_addresses TO '*';",
-        "ALTER SYSTEM SET max_connections TO '100';",
-        "ALTER SYSTEM SET random_page_cost TO '1.1';",
-        "ALTER SYSTEM SET effective_io_concurrency TO '200';",
-        f"ALTER SYSTEM SET max_worker_processes TO '{cores}';",
-        f"ALTER SYSTEM SET max_parallel_workers TO '{cores}';",
-        f"ALTER SYSTEM SET max_parallel_workers_per_gather TO '{cores // 2}';",
-        f"ALTER SYSTEM SET max_parallel_maintenance_workers TO '{cores // 2}';",
+        f"ALTER SYSTEM SET {name} TO '{value}';" for name, value in settings.items()
     ]
+    statements.append("SELECT pg_reload_conf();")
     execute_with_autocommit(engine, statements)
 
 
+def recommended_settings(
+    cores: int,
+    memory_mb: int,
+    durability: constant.Durability = constant.Durability.DURABLE,
+) -> dict[str, str]:
+    """
+    Build the recommended system settings for the given resources.
+
+    Examples:
+        >>> settings = recommended_settings(8, 16384)
+        >>> settings["shared_buffers"], settings["max_parallel_workers_per_gather"]
+        ('4096MB', '4')
+    """
+    settings = {
+        "shared_buffers": f"{memory_mb // 4}MB",
+        "effective_cache_size": f"{3 * memory_mb // 4}MB",
+        "work_mem": f"{8 * memory_mb // 1024}MB",
+        "maintenance_work_mem": f"{memory_mb // 16}MB",
+        "min_wal_size": f"{memory_mb // 8}MB",
+        "max_wal_size": f"{memory_mb // 2}MB",
+        "checkpoint_completion_target": "0.9",
+        "wal_buffers": "-1",
+        "listen_addresses": "*",
+        "max_connections": "100",
+        "random_page_cost": "1.1",
+        "effective_io_concurrency": "200",
+        "max_worker_processes": f"{cores}",
+        "max_parallel_workers": f"{cores}",
+        "max_parallel_workers_per_gather": f"{cores // 2}",
+        "max_parallel_maintenance_workers": f"{cores // 2}",
+    }
+    settings.update(durability_settings(memory_mb, durability))
+    return settings
+
+
+def durability_settings(
+    memory_mb: int,
+    durability: constant.Durability,
+) -> dict[str, str]:
+    """
+    Build the settings of a durability profile.
+
+    The profiles trade the crash safety of the database for speed:
+
+    - `durable` keeps the PostgreSQL defaults,
+    - `scratch` does not wait for the WAL to be flushed on commit and makes
+      room for a larger WAL, losing the latest transactions on a crash,
+    - `disposable` also stops syncing the data to disk, risking the
+      corruption of the whole cluster on a crash. It is only suitable for a
+      database thrown away after the analysis, like the Docker one.
+
+    Examples:
+        >>> durability_settings(4096, constant.Durability.SCRATCH)["max_wal_size"]
+        '8192MB'
+    """
+    settings = {
+        "synchronous_commit": "on",
+        "checkpoint_timeout": "5min",
+        "fsync": "on",
+        "full_page_writes": "on",
+    }
+    if durability == constant.Durability.DURABLE:
+        return settings
+    settings.update(
+        {
+            "synchronous_commit": "off",
+            "checkpoint_timeout": "30min",
+            "max_wal_size": f"{2 * memory_mb}MB",
+        }
+    )
+    if durability == constant.Durability.DISPOSABLE:
+        settings.update({"fsync": "off", "full_page_writes": "off"})
+    return settings
+
+
+def current_durability(engine: Engine) -> constant.Durability:
+    """Retrieve the durability profile in effect on the server."""
+    query = "SELECT current_setting('fsync'), current_setting('synchronous_commit');"
+    with engine.connect() as conn:
+        fsync, synchronous_commit = conn.execute(text(query)).one()
+    if fsync == "off":
+        return constant.Durability.DISPOSABLE
+    if synchronous_commit == "off":
+        return constant.Durability.SCRATCH
+    return constant.Durability.DURABLE
+
+
 def configure_extensions(engine: Engine) -> None:
     """Configure the required extensions."""
     statements = [
@@ -160,6 +386,9 @@ def configure_schemas(engine: Engine, pguser: str) -> None:
     ]
     execute_with_autocommit(engine, statements)
 
+    # Reconnect to pick up the search path of the role.
+    engine.dispose()
+
 
 def table_exists(engine: Engine, table: str) -> bool:
     """Check whether a table exists or not."""
@@ -174,6 +403,34 @@ def table_exists(engine: Engine, table: str) -> bool:
         return bool(res.scalar_one())
 
 
+def describe_tables(
+    engine: Engine,
+    tables: typing.Sequence[str],
+) -> dict[str, dict[str, str]]:
+    """
+    Describe the columns of the tables existing in the database.
+
+    The tables are looked up in a single catalog query, in the `generated` and
+    `received` schemas. Tables which do not exist are left out of the result.
+
+    :returns: a mapping of the schema-qualified table names to their ordered
+        columns and types.
+    """
+    query = """SELECT table_schema, table_name, column_name, udt_name
+        FROM information_schema.columns
+        WHERE (table_schema = 'generated' OR table_schema = 'received')
+        AND table_name = ANY(:tables)
+        ORDER BY table_schema, table_name, ordinal_position;
+    """
+    descriptions: dict[str, dict[str, str]] = {}
+    with engine.connect() as conn:
+        res = conn.execute(text(query), {"tables": list(tables)})
+        for table_schema, table_name, column_name, udt_name in res:
+            qualified_name = f"{table_schema}.{table_name}"
+            descriptions.setdefault(qualified_name, {})[column_name] = udt_name
+    return descriptions
+
+
 def reset_tables(engine: Engine) -> None:
     """
     Delete tables and reset the schemas.
@@ -193,6 +450,444 @@ def reset_tables(engine: Engine) -> None:
     execute_with_autocommit(engine, statements)
 
 
+def database_name(slug: str, prefix: str = "bna") -> str:
+    """
+    Build a database name from a slug.
+
+    The names exceeding the PostgreSQL identifier length are truncated and
+    suffixed with a digest to remain unique.
+
+    Examples:
+        >>> database_name("santa-rosa-new-mexico-united-states")
+        'bna_santa_rosa_new_mexico_united_states'
+        >>> len(database_name("x" * 80))
+        63
+    """
+    name = f"{prefix}_{slug.replace('-', '_')}"
+    if len(name) > MAX_IDENTIFIER_LENGTH:
+        digest = hashlib.sha256(name.encode()).hexdigest()[:8]
+        name = f"{name[: MAX_IDENTIFIER_LENGTH - len(digest) - 1]}_{digest}"
+    return name
+
+
+def database_url_for(database_url: str, database: str) -> str:
+    """
+    Build the URL of another database on the same server.
+
+    Examples:
+        >>> database_url_for("postgresql://u:p@localhost:5432/postgres", "bna_x")
+        'postgresql://u:p@localhost:5432/bna_x'
+    """
+    url = make_url(database_url).set(database=database)
+    return url.render_as_string(hide_password=False)
+
+
+def create_database(engine: Engine, name: str, template: str | None = None) -> None:
+    """
+    Create a database, replacing any existing one with the same name.
+
+    The database is copied from `template` if specified, which is much faster
+    than configuring a new database from scratch.
+    """
+    create = f'CREATE DATABASE "{name}"'
+    if template:
+        create += f' TEMPLATE "{template}"'
+    statements = [
+        f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE);',
+        f"{create};",
+    ]
+    execute_with_autocommit(engine, statements)
+
+
+def drop_database(engine: Engine, name: str) -> None:
+    """Drop a database, terminating its remaining connections."""
+    execute_with_autocommit(engine, [f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE);'])
+
+
+def template_exists(engine: Engine, name: str = TEMPLATE_DATABASE) -> bool:
+    """Check whether a template database exists or not."""
+    query = """SELECT EXISTS (
+        SELECT FROM pg_database
+        WHERE datname = :name AND datistemplate
+        );
+    """
+    with engine.connect() as conn:
+        res = conn.execute(text(query), {"name": name})
+        return bool(res.scalar_one())
+
+
+def mark_template(engine: Engine, name: str, *, is_template: bool = True) -> None:
+    """
+    Mark a database as a template, or unmark it.
+
+    A template database does not accept connections, as a database cannot be
+    copied while being connected to.
+    """
+    statement = (
+        f'ALTER DATABASE "{name}" WITH IS_TEMPLATE {is_template} '
+        f"ALLOW_CONNECTIONS {not is_template};"
+    )
+    execute_with_autocommit(engine, [statement])
+
+
+def server_cores(engine: Engine) -> int:
+    """
+    Estimate the number of cores available to the server from its settings.
+
+    The estimate is the number of worker processes the server was started with,
+    which only matches the configured cores after a restart.
+    """
+    with engine.connect() as conn:
+        res = conn.execute(text("SELECT current_setting('max_worker_processes')"))
+        return int(res.scalar_one())
+
+
+def max_connections(engine: Engine) -> int:
+    """Retrieve the maximum number of connections to the server."""
+    with engine.connect() as conn:
+        res = conn.execute(text("SELECT current_setting('max_connections')"))
+        return int(res.scalar_one())
+
+
+def server_memory_mb(engine: Engine) -> int:
+    """
+    Estimate the amount of memory available to the server from its settings, in MB.
+
+    The estimate is four times the shared buffers the server was started with,
+    which only matches the configured memory after a restart.
+    """
+    query = "SELECT pg_size_bytes(current_setting('shared_buffers'));"
+    with engine.connect() as conn:
+        res = conn.execute(text(query))
+        return 4 * int(res.scalar_one()) // 1024**2
+
+
+def parse_cpu_list(cpus: str) -> int:
+    """
+    Count the CPUs of a CPU list, like the online CPUs of a Linux host.
+
+    Examples:
+        >>> parse_cpu_list("0-3,6")
+        5
+    """
+    count = 0
+    for cpu_range in cpus.strip().split(","):
+        first, _, last = cpu_range.partition("-")
+        count += int(last or first) - int(first) + 1
+    return count
+
+
+def parse_meminfo(meminfo: str) -> int:
+    r"""
+    Retrieve the total memory, in MB, from the content of `/proc/meminfo`.
+
+    Examples:
+        >>> parse_meminfo("MemTotal:       16384000 kB\nMemFree: 1024 kB")
+        16000
+    """
+    match = re.search(r"^MemTotal:\s+(\d+) kB", meminfo, re.MULTILINE)
+    if not match:
+        raise ValueError("`MemTotal` not found in the memory information")
+    return int(match[1]) // 1024
+
+
+def parse_cpu_max(cpu_max: str) -> int | None:
+    """
+    Retrieve the CPU limit of a control group, if any.
+
+    Examples:
+        >>> parse_cpu_max("250000 100000")
+        3
+        >>> parse_cpu_max("max 100000") is None
+        True
+    """
+    quota, period = cpu_max.split()
+    if quota == "max":
+        return None
+    return max(1, math.ceil(int(quota) / int(period)))
+
+
+def parse_memory_max(memory_max: str) -> int | None:
+    """
+    Retrieve the memory limit of a control group, in MB, if any.
+
+    Examples:
+        >>> parse_memory_max("8589934592")
+        8192
+        >>> parse_memory_max("max") is None
+        True
+    """
+    memory_max = memory_max.strip()
+    if memory_max == "max":
+        return None
+    return int(memory_max) // 1024**2
+
+
+def resources_from(read: typing.Callable[[str], str | None]) -> tuple[int, int] | None:
+    """
+    Compute the cores and the memory (in MB) of a Linux host from its files.
+
+    The files are read with `read`, which returns `None` for unreadable files.
+    The limits of the control group take precedence over the host resources.
+    """
+    cpus = read(CPU_ONLINE_FILE)
+    meminfo = read(MEMINFO_FILE)
+    if not cpus or not meminfo:
+        return None
+    cores = parse_cpu_list(cpus)
+    memory_mb = parse_meminfo(meminfo)
+    if (cpu_max := read(CGROUP_CPU_MAX_FILE)) and (limit := parse_cpu_max(cpu_max)):
+        cores = min(cores, limit)
+    memory_max = read(CGROUP_MEMORY_MAX_FILE)
+    if memory_max and (limit := parse_memory_max(memory_max)):
+        memory_mb = min(memory_mb, limit)
+    return cores, memory_mb
+
+
+def read_server_file(engine: Engine, path: str) -> str | None:
+    """
+    Read a file from the database server.
+
+    This requires the superuser or the `pg_read_server_files` role, `None` is
+    returned otherwise, or if the file does not exist.
+    """
+    try:
+        with engine.connect() as conn:
+            res = conn.execute(
+                text("SELECT pg_read_file(:path, true);"), {"path": path}
+            )
+            return res.scalar_one()
+    except DBAPIError as e:
+        logger.debug(f"cannot read {path} from the database server: {e}")
+        return None
+
+
+def read_local_file(path: str) -> str | None:
+    """Read a file from the local machine, if possible."""
+    try:
+        return pathlib.Path(path).read_text()
+    except OSError:
+        return None
+
+
+def detect_resources(engine: Engine) -> tuple[int, int]:
+    """
+    Detect the cores and the memory (in MB) available to the database server.
+
+    The resources are read from the server itself. Without the permissions to
+    do so, they are read from the local machine if the server runs on it.
+    """
+    resources = resources_from(functools.partial(read_server_file, engine))
+    if not resources and engine.url.host in LOCAL_HOSTS:
+        resources = resources_from(read_local_file)
+    if not resources:
+        raise ValueError(
+            "unable to detect the resources of the database server, "
+            "the cores and memory must be specified"
+        )
+    return resources
+
+
+def server_resources(engine: Engine) -> tuple[int, int]:
+    """
+    Retrieve the cores and the memory (in MB) available to the database server.
+
+    The resources are detected when possible, otherwise they are estimated from
+    the settings of the server.
+    """
+    try:
+        return detect_resources(engine)
+    except ValueError as e:
+        logger.warning(f"estimating the server resources from its settings: {e}")
+        return server_cores(engine), server_memory_mb(engine)
+
+
+def normalize_setting(value: str, unit: str | None = None) -> str | float:
+    """
+    Normalize the value of a setting, for comparison purposes.
+
+    The quantities are converted to bytes or milliseconds, given their suffix
+    or the `unit` of the setting.
+
+    Examples:
+        >>> normalize_setting("4096MB") == normalize_setting("524288", "8kB")
+        True
+        >>> normalize_setting("30min") == normalize_setting("1800", "s")
+        True
+        >>> normalize_setting("On")
+        'on'
+    """
+    match = re.fullmatch(r"(-?\d+(?:\.\d+)?)\s*([a-zA-Z]*)", value.strip())
+    if not match:
+        return value.strip().lower()
+    number, suffix = float(match[1]), match[2]
+    if suffix:
+        if suffix not in SETTING_UNITS:
+            return value.strip().lower()
+        return number * SETTING_UNITS[suffix]
+    if unit:
+        unit_match = re.fullmatch(r"(\d*)([a-zA-Z]+)", unit)
+        if unit_match and unit_match[2] in SETTING_UNITS:
+            return number * int(unit_match[1] or 1) * SETTING_UNITS[unit_match[2]]
+    return number
+
+
+@dataclasses.dataclass(frozen=True)
+class SettingCheck:
+    """Compare the effective value of a setting to the expected one."""
+
+    name: str
+    expected: str
+    actual: str | None
+    unit: str | None = None
+    pending_restart: bool = False
+
+    @property
+    def ok(self) -> bool:
+        """Tell whether the setting is in effect with the expected value."""
+        if self.actual is None or self.pending_restart:
+            return False
+        # -1 lets PostgreSQL size the setting automatically.
+        if self.expected == "-1":
+            return True
+        expected = normalize_setting(self.expected)
+        return expected == normalize_setting(self.actual, self.unit)
+
+    @property
+    def raises(self) -> bool:
+        """Tell whether the expected value would raise the setting in effect."""
+        if self.actual is None:
+            return False
+        expected = normalize_setting(self.expected)
+        actual = normalize_setting(self.actual, self.unit)
+        if isinstance(expected, float) and isinstance(actual, float):
+            return expected > actual
+        return expected != actual
+
+
+def check_settings(
+    engine: Engine,
+    expected: typing.Mapping[str, str],
+) -> list[SettingCheck]:
+    """
+    Compare the settings in effect on the server to the expected ones.
+
+    The settings changed with `ALTER SYSTEM` but waiting for a restart to take
+    effect are reported as such.
+    """
+    query = """SELECT name, setting, unit, pending_restart
+        FROM pg_settings
+        WHERE name = ANY(:names);
+    """
+    with engine.connect() as conn:
+        res = conn.execute(text(query), {"names": list(expected)})
+        actual = {
+            name: (setting, unit, pending) for name, setting, unit, pending in res
+        }
+    return [
+        SettingCheck(name, value, *actual.get(name, (None, None, False)))
+        for name, value in expected.items()
+    ]
+
+
+def workload_settings(
+    workload: constant.Workload,
+    cores: int,
+    memory_mb: int,
+) -> dict[str, str]:
+    """
+    Build the session settings suited to a workload.
+
+    The bulk loads and index builds get more maintenance memory, the analytical
+    queries get more memory to sort and hash and more parallel workers, and the
+    short updates skip the JIT compilation which costs more than it saves.
+
+    Examples:
+        >>> workload_settings(constant.Workload.LOAD, 8, 16384)
+        {'maintenance_work_mem': '2048MB'}
+        >>> workload_settings(constant.Workload.ANALYTICS, 8, 16384)
+        {'work_mem': '409MB', 'max_parallel_workers_per_gather': '4'}
+        >>> workload_settings(constant.Workload.UPDATES, 8, 16384)
+        {'jit': 'off'}
+    """
+    if workload == constant.Workload.LOAD:
+        return {"maintenance_work_mem": f"{memory_mb // 8}MB"}
+    if workload == constant.Workload.ANALYTICS:
+        workers = max(1, cores // 2)
+        # A hash node may use twice work_mem (the default hash_mem_multiplier) in
+        # the leader and in each worker: bound it to a quarter of the memory.
+        return {
+            "work_mem": f"{max(4, memory_mb // (4 * 2 * (workers + 1)))}MB",
+            "max_parallel_workers_per_gather": f"{workers}",
+        }
+    return {"jit": "off"}
+
+
+def pgoptions(settings: typing.Mapping[str, str]) -> str:
+    """
+    Format session settings for the `PGOPTIONS` environment variable.
+
+    Examples:
+        >>> pgoptions({"jit": "off", "work_mem": "64MB"})
+        '-c jit=off -c work_mem=64MB'
+    """
+    return " ".join(f"-c {name}={value}" for name, value in settings.items())
+
+
+def workload_pgoptions() -> str | None:
+    """Format the settings of the current workload for `PGOPTIONS`, if any."""
+    settings = _SESSION_SETTINGS.get()
+    return pgoptions(settings) if settings else None
+
+
+@contextlib.contextmanager
+def server_share(share: float) -> typing.Iterator[None]:
+    """
+    Size the workloads within the context for a share of the server resources.
+
+    This keeps the analyses running concurrently on the same server from
+    claiming its whole memory and all its parallel workers each.
+    """
+    if not 0 < share <= 1:
+        raise ValueError(f"the share of the server must be in (0, 1], not {share}")
+    token = _SERVER_SHARE.set(share)
+    try:
+        yield
+    finally:
+        _SERVER_SHARE.reset(token)
+
+
+@contextlib.contextmanager
+def workload(
+    engine: Engine,
+    kind: constant.Workload,
+) -> typing.Iterator[dict[str, str]]:
+    """
+    Tune the database sessions for a kind of workload within the context.
+
+    The settings are sized for the share of the server resources of the current
+    analysis, and only kept when they raise the settings in effect. They are
+    applied to the transactions of `execute_query`, and are available to the
+    client tools like `osm2pgsql` through `workload_pgoptions`.
+    """
+    cores, memory_mb = server_resources(engine)
+    share = _SERVER_SHARE.get()
+    expected = workload_settings(
+        kind, max(1, int(cores * share)), max(1, int(memory_mb * share))
+    )
+    settings = {
+        setting.name: setting.expected
+        for setting in check_settings(engine, expected)
+        if setting.raises
+    }
+    logger.debug(f"{kind} workload: {settings}")
+    token = _SESSION_SETTINGS.set(settings)
+    try:
+        yield settings
+    finally:
+        _SESSION_SETTINGS.reset(token)
+
+
 def sanitize_sql_filename(filename: str) -> str:
     r"""
     Sanitize a filename for use in PostgreSQL commands by escaping special characters.
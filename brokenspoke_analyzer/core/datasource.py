@@ -1,7 +1,7 @@
 """Represent the source adapter module."""
 
+import math
 import pathlib
-import string
 from abc import (
     ABC,
     abstractmethod,
@@ -11,11 +11,12 @@ from collections import abc
 import geopandas as gpd
 import numpy as np
 import rasterio
-import rasterio.features
+import rasterio.errors
+import rasterio.windows
+import shapely
 import yarl
 from loguru import logger
 from pyrosm import data
-from shapely.geometry import shape
 
 from brokenspoke_analyzer.core import (
     utils,
@@ -194,16 +195,21 @@ class WorldPopAdapter(SourceAdapter):
         country_iso_3166: str,
         year: int,
         mirror: str | None = None,
+        boundary_file: pathlib.Path | None = None,
     ) -> None:
         """
         Initialize the WorldPopAdapter.
 
         country must conform to using an ISO_3166 country code
         https://en.wikipedia.org/wiki/List_of_ISO_3166_country_codes
+
+        If a boundary file is provided, the population is limited to the area it
+        covers, otherwise the whole country is processed.
         """
         super().__init__(mirror)
         self.country_iso_3166 = country_iso_3166
         self.year = year
+        self.boundary_file = boundary_file
 
     @staticmethod
     def key() -> str:
@@ -238,7 +244,13 @@ class WorldPopAdapter(SourceAdapter):
         return [base_url / str(f) for f in self.files]
 
     def prepare(self, datastore: pathlib.Path) -> None:
-        """Prepare the data files."""
+        """
+        Prepare the data files.
+
+        Each populated pixel becomes a census block. When a boundary file is
+        provided, only the window of the raster covering it is read, and only the
+        pixels intersecting the boundary are kept.
+        """
         if len(self.files) != 1:
             raise ValueError(
                 f"only 1 file was expected, {len(self.files)} found: {self.files}"
@@ -251,46 +263,100 @@ class WorldPopAdapter(SourceAdapter):
             return
         logger.debug(f"{file_shp} doesn't exist, creating shapefile")
         with rasterio.open(file_geotiff) as src:
-            # Read the population count as a numpy array
-            band_data = src.read(1)
-
-            # Get spatial metadata
-            transform = src.transform
             crs = src.crs
-            nodata_val = src.nodata
-
-            # Mask to ignore NoData values
-            mask = (
-                band_data != nodata_val if nodata_val is not None else band_data > 0
-            )  # Fallback: ignore 0 population pixels
+            window = None
+            boundary = None
+            if self.boundary_file:
+                boundary = (
+                    gpd.read_file(self.boundary_file).to_crs(crs).geometry.union_all()
+                )
+                window = boundary_window(src, boundary.bounds)
+                logger.debug(f"{window=}")
 
-            # Generate shapes from the raster pixels
-            shapes_generator = rasterio.features.shapes(
-                band_data, mask=mask, transform=transform
-            )
+            # Read the population count as a numpy array
+            band_data = src.read(1, window=window)
+            transform = src.window_transform(window) if window else src.transform
+            nodata_val = src.nodata
 
-            # Convert the extracted shapes into Shapely geometries
-            records = [
-                {"geometry": shape(geom), "POP20": val}
-                for geom, val in shapes_generator
-            ]
+        # Mask to ignore NoData values
+        mask = (
+            band_data != nodata_val if nodata_val is not None else band_data > 0
+        )  # Fallback: ignore 0 population pixels
+
+        # Build a polygon for each populated pixel.
+        rows, cols = np.nonzero(mask)
+        geometries = pixel_polygons(transform, rows, cols)
+        population = band_data[rows, cols]
+        if boundary is not None:
+            shapely.prepare(boundary)
+            within = shapely.intersects(boundary, geometries)
+            geometries = geometries[within]
+            population = population[within]
+            rows = rows[within]
+            cols = cols[within]
 
         # Load into a GeoDataFrame
-        gdf = gpd.GeoDataFrame(records)
-        gdf.set_crs(crs, inplace=True)
+        gdf = gpd.GeoDataFrame(
+            {"POP20": population}, geometry=gpd.GeoSeries(geometries, crs=crs)
+        )
 
-        # Generate GEOID20 column, with random 15 character lowercase ACII string,
-        # to simulate US census data.
-        n_rows = len(gdf)
-        rng = np.random.default_rng()
-        random_array = rng.choice(list(string.ascii_lowercase), size=(n_rows, 15))
-        gdf["GEOID20"] = ["".join(row) for row in random_array]
+        # Generate GEOID20 column, with 15 character lowercase ACII string derived
+        # from the position of the pixels in the raster, to simulate US census data.
+        row_off, col_off = (window.row_off, window.col_off) if window else (0, 0)
+        gdf["GEOID20"] = utils.synthetic_geoid20(cols + col_off, rows + row_off)
 
         # Export to Shapefile
         gdf.to_file(file_shp)
         logger.debug(f"Shapefile successfully saved to {file_shp}")
 
 
+def boundary_window(
+    src: rasterio.DatasetReader,
+    bounds: tuple[float, float, float, float],
+) -> rasterio.windows.Window:
+    """
+    Compute the raster window covering the bounds, in whole pixels.
+
+    :param src: raster dataset
+    :param bounds: (minx, miny, maxx, maxy) in the CRS of the raster
+    """
+    window = rasterio.windows.from_bounds(*bounds, transform=src.transform)
+    row_start = math.floor(window.row_off)
+    col_start = math.floor(window.col_off)
+    row_stop = math.ceil(window.row_off + window.height)
+    col_stop = math.ceil(window.col_off + window.width)
+    try:
+        return rasterio.windows.Window.from_slices(
+            (row_start, row_stop), (col_start, col_stop)
+        ).intersection(
+            rasterio.windows.Window.from_slices((0, src.height), (0, src.width))
+        )
+    except rasterio.errors.WindowError as e:
+        raise ValueError("the boundaries do not overlap the raster") from e
+
+
+def pixel_polygons(
+    transform: rasterio.Affine,
+    rows: np.ndarray,
+    cols: np.ndarray,
+) -> np.ndarray:
+    """
+    Build the polygons of the raster pixels at the given positions.
+
+    Example:
+        >>> transform = rasterio.Affine(10, 0, 100, 0, -10, 50)
+        >>> [p.bounds for p in pixel_polygons(transform, np.array([0]), np.array([2]))]
+        [(120.0, 40.0, 130.0, 50.0)]
+    """
+    # Apply the affine transformation to the pixel corners.
+    a, b, c, d, e, f = transform[:6]
+    x0, y0 = a * cols + b * rows + c, d * cols + e * rows + f
+    x1, y1 = x0 + a + b, y0 + d + e
+    return shapely.box(
+        np.minimum(x0, x1), np.minimum(y0, y1), np.maximum(x0, x1), np.maximum(y0, y1)
+    )
+
+
 class CitySpeedLimitAdapter(SourceAdapter):
     """Adapter for city speed limit data."""
 
@@ -3,11 +3,15 @@
 from __future__ import annotations
 
 import enum
+import hashlib
+import io
+import json
 import pathlib
 from typing import TYPE_CHECKING
 
 import aiohttp
 import geopandas
+import shapely
 from loguru import logger
 from obstore import exceptions as obstore_exceptions
 from obstore.store import (
@@ -25,6 +29,7 @@ from brokenspoke_analyzer.core import (
     datasource,
     downloader,
     file_utils,
+    utils,
 )
 from brokenspoke_analyzer.core.datasource import (
     CountySubdivisionAdapter,
@@ -36,6 +41,7 @@ if TYPE_CHECKING:
 
 
 CHUNK_SIZE = 5 * 1024 * 1024  # 5MB
+POPULATION_CACHE_KEY = "population"
 
 
 def exists(store: ObjectStore, path: str) -> bool:
@@ -275,6 +281,33 @@ class BNADataStore:
             logger.debug(f"Putting file {file} into the store at {path}")
             await self.copy_to_store(path)
 
+    async def restore_population(self, key: str) -> bool:
+        """
+        Restore a cached population layer into the data store.
+
+        The layer is written as the `population` shapefile expected by the import.
+
+        :returns: True if the layer was found in the cache.
+        """
+        path = f"{POPULATION_CACHE_KEY}/{key}.parquet"
+        if not self.is_cached(path):
+            return False
+        logger.debug(f"Restoring the population from the cache at {path}")
+        res = await self.cache.get_async(path)
+        content = await res.bytes_async()
+        population = geopandas.read_parquet(io.BytesIO(bytes(content)))
+        analysis.simulate_census_blocks(self.store.prefix, population)
+        return True
+
+    async def save_population(self, key: str) -> None:
+        """Save the population layer of the data store into the cache."""
+        path = f"{POPULATION_CACHE_KEY}/{key}.parquet"
+        logger.debug(f"Saving the population into the cache at {path}")
+        population = geopandas.read_file(self.store.prefix / "population.shp")
+        buffer = io.BytesIO()
+        population.to_parquet(buffer, compression="zstd")
+        await self.cache.put_async(path, buffer.getvalue())
+
     # --------------------------------------------------------------------------
     # Download helpers
     # --------------------------------------------------------------------------
@@ -340,6 +373,7 @@ class BNADataStore:
         session: aiohttp.ClientSession,
         country_iso_3166: str,
         year: int,
+        boundary_file: pathlib.Path | None = None,
         *,
         cache_only: bool = False,
     ) -> None:
@@ -347,8 +381,13 @@ class BNADataStore:
         Download a WorldPop 1km resolution geoTIFF for a specific country.
 
         Default year to current year
+
+        If a boundary file is provided, the population is limited to the area it
+        covers.
         """
-        s = datasource.WorldPopAdapter(country_iso_3166, year, self.mirror)
+        s = datasource.WorldPopAdapter(
+            country_iso_3166, year, self.mirror, boundary_file
+        )
         await self.fetch_from_source(session, s, cache_only=cache_only)
 
     async def download_osm_data(
@@ -468,3 +507,21 @@ class BNADataStore:
         for ext in extensions:
             f = boundary_file_name_stem.with_suffix(ext)
             await self.put(str(f), prefix / f, cache_only=cache_only)
+
+
+def population_cache_key(
+    boundary_file: pathlib.Path,
+    source: str,
+    **parameters: str | int,
+) -> str:
+    """
+    Compute the cache key of the population layer of a city.
+
+    The key depends on the city boundaries, the source of the population and the
+    parameters used to derive the layer from it.
+    """
+    boundary = geopandas.read_file(boundary_file).to_crs(utils.WGS84_CRS).union_all()
+    boundary = shapely.normalize(shapely.set_precision(boundary, 1e-7))
+    digest = hashlib.sha256(shapely.to_wkb(boundary))
+    digest.update(json.dumps({"source": source, **parameters}, sort_keys=True).encode())
+    return digest.hexdigest()
@@ -21,27 +21,81 @@ References:
 
 from __future__ import annotations
 
+import asyncio
+import concurrent.futures
+import contextlib
+import dataclasses
 import datetime
 import enum
+import fnmatch
+import functools
+import hashlib
+import json
 import os
 import pathlib
-import shutil
 import tempfile
 import typing
+import zipfile
 from typing import TYPE_CHECKING
 
 import boto3
+import geopandas as gpd
+import obstore
+import tenacity
 import yarl
 from loguru import logger
+from obstore.exceptions import GenericError
 from obstore.store import from_url
+from sqlalchemy import text
 
-from brokenspoke_analyzer.core import runner
+from brokenspoke_analyzer.core import (
+    constant,
+    runner,
+)
 from brokenspoke_analyzer.core.database import dbcore
 
 if TYPE_CHECKING:
+    from obstore import WritableFile
     from obstore.store import ObjectStore
     from sqlalchemy.engine import Engine
 
+# Number of tables exported concurrently.
+DEFAULT_EXPORT_WORKERS = 4
+
+# Number of files uploaded concurrently.
+DEFAULT_UPLOAD_WORKERS = 8
+
+# Size of the parts of the multipart uploads, the smaller files are sent at once.
+UPLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+
+# Maximum number of attempts to upload a file.
+UPLOAD_ATTEMPTS = 3
+
+# Files composing a shapefile.
+SHAPEFILE_SUFFIXES = [".shp", ".shx", ".dbf", ".prj", ".cpg"]
+
+# Bytes of the dBase file header recording the date of its last update.
+DBF_DATE_BYTES = slice(1, 4)
+
+# Name of the zip archive bundling the exported files.
+BUNDLE_FILE = "bundle.zip"
+
+# Name of the file listing the content hash of the exported files.
+MANIFEST_FILE = "manifest.json"
+
+# Associate the bundle compression methods to their zip counterpart.
+BUNDLE_COMPRESSIONS = {
+    constant.BundleCompression.STORED: zipfile.ZIP_STORED,
+    constant.BundleCompression.DEFLATE: zipfile.ZIP_DEFLATED,
+    constant.BundleCompression.LZMA: zipfile.ZIP_LZMA,
+}
+
+# SRID of the geographic exports.
+WGS84_SRID = 4326
+
+# Schemas of the exported tables, in the order of the search path.
+EXPORT_SCHEMAS = ("generated", "received")
+
 # Catalog the tables and associate them to an export format.
 TABLE_CATALOG = {
     "shp": [
@@ -75,6 +129,9 @@ TABLE_CATALOG = {
         "mileage",
     ],
 }
+# The columnar formats are offered for the same tables as GeoJSON.
+TABLE_CATALOG["parquet"] = TABLE_CATALOG["geojson"]
+TABLE_CATALOG["fgb"] = TABLE_CATALOG["geojson"]
 
 
 class Exporter(enum.StrEnum):
@@ -88,68 +145,368 @@ class Exporter(enum.StrEnum):
     r2_custom = "r2_custom"
 
 
+@dataclasses.dataclass(frozen=True)
+class TableProfile:
+    """Define how a table is exported."""
+
+    # Patterns of the columns to export, all of them if empty. The geometry
+    # columns are always exported.
+    columns: tuple[str, ...] = ()
+    # Tolerance used to simplify the geometries, given in units of the table SRID.
+    tolerance: float | None = None
+
+
+# Columns of the census blocks needed to display the scores.
+BLOCK_SCORE_COLUMNS = ("geoid20", "pop20", "*_score")
+
+# Columns of the ways needed to display the stress network.
+WAY_STRESS_COLUMNS = (
+    "road_id",
+    "name",
+    "functional_class",
+    "speed_limit",
+    "ft_bike_infra",
+    "tf_bike_infra",
+    "ft_seg_stress",
+    "ft_int_stress",
+    "tf_seg_stress",
+    "tf_int_stress",
+)
+
+# Define the export profiles, associating tables to their export settings. The
+# tables which are not listed are exported entirely.
+EXPORT_PROFILES: dict[constant.ExportProfile, dict[str, TableProfile]] = {
+    constant.ExportProfile.FULL: {},
+    constant.ExportProfile.SCORES: {
+        "neighborhood_census_blocks": TableProfile(columns=BLOCK_SCORE_COLUMNS),
+        "neighborhood_ways": TableProfile(columns=WAY_STRESS_COLUMNS),
+    },
+    constant.ExportProfile.WEB: {
+        "neighborhood_boundary": TableProfile(tolerance=10),
+        "neighborhood_census_blocks": TableProfile(
+            columns=BLOCK_SCORE_COLUMNS, tolerance=5
+        ),
+        "neighborhood_ways": TableProfile(columns=WAY_STRESS_COLUMNS, tolerance=2),
+    },
+}
+
+
+def project_columns(
+    columns: typing.Mapping[str, str],
+    profile: TableProfile,
+) -> dict[str, str]:
+    """
+    Select the columns of a table matching the profile.
+
+    Examples:
+        >>> columns = {"geoid20": "text", "pop_score": "float8", "geom": "geometry"}
+        >>> project_columns(columns, TableProfile(columns=("*_score",)))
+        {'pop_score': 'float8', 'geom': 'geometry'}
+        >>> project_columns(columns, TableProfile()) == columns
+        True
+    """
+    if not profile.columns:
+        return dict(columns)
+    return {
+        column: type_
+        for column, type_ in columns.items()
+        if type_ == "geometry"
+        or any(fnmatch.fnmatchcase(column, pattern) for pattern in profile.columns)
+    }
+
+
+def resolve_table(
+    descriptions: typing.Mapping[str, typing.Mapping[str, str]],
+    table: str,
+) -> str | None:
+    """
+    Find the schema-qualified name of a described table.
+
+    Like the search path, the `generated` schema takes precedence.
+
+    Examples:
+        >>> resolve_table({"received.t": {}, "generated.t": {}}, "t")
+        'generated.t'
+        >>> resolve_table({"received.t": {}}, "u") is None
+        True
+    """
+    return next(
+        (
+            qualified_name
+            for schema in EXPORT_SCHEMAS
+            if (qualified_name := f"{schema}.{table}") in descriptions
+        ),
+        None,
+    )
+
+
+def table_name(table: str) -> str:
+    """
+    Strip the schema from a table name.
+
+    Examples:
+        >>> table_name("generated.neighborhood_ways")
+        'neighborhood_ways'
+        >>> table_name("mileage")
+        'mileage'
+    """
+    return table.rpartition(".")[2]
+
+
+def select_table(
+    table: str,
+    columns: typing.Mapping[str, str],
+    *,
+    crs: int | None = None,
+    tolerance: float | None = None,
+) -> str:
+    """
+    Build the query selecting the columns of a table.
+
+    The geometries are simplified with `tolerance` then reprojected to `crs` if
+    specified.
+
+    Examples:
+        >>> select_table("t", {"id": "int4", "geom": "geometry"}, tolerance=5)
+        'SELECT "id", ST_SimplifyPreserveTopology("geom", 5) AS "geom" FROM t'
+    """
+    selection = []
+    for column, type_ in columns.items():
+        expression = f'"{column}"'
+        if type_ == "geometry":
+            if tolerance:
+                expression = f"ST_SimplifyPreserveTopology({expression}, {tolerance})"
+            if crs:
+                expression = f"ST_Transform({expression}, {crs})"
+        if expression != f'"{column}"':
+            expression = f'{expression} AS "{column}"'
+        selection.append(expression)
+    return f"SELECT {', '.join(selection)} FROM {table}"
+
+
 def export_to_csv(
     export_dir: pathlib.Path,
-    tables: typing.Sequence[str],
+    table: str,
+    columns: typing.Mapping[str, str],
     engine: Engine,
-) -> None:
-    """Export a list of PostgreSQL tables to CSV files."""
-    for table in tables:
-        # Skip export if the table does not exist.
-        if not dbcore.table_exists(engine, table):
-            continue
-        csv_file = export_dir / f"{table}.csv"
-        dbcore.export_to_csv(engine, csv_file, table)
+    profile: TableProfile,
+) -> list[pathlib.Path]:
+    """Export a PostgreSQL table to a CSV file."""
+    csv_file = export_dir / f"{table_name(table)}.csv"
+    query = select_table(table, columns) if profile.columns else None
+    dbcore.export_to_csv(engine, csv_file, table, query)
+    return [csv_file]
 
 
 def export_to_geojson(
     export_dir: pathlib.Path,
-    tables: typing.Sequence[str],
-    database_url: str,
-) -> None:
-    """Export a list of PostGIS tables to GeoJSON files."""
-    engine = dbcore.create_psycopg_engine(database_url)
-    for table in tables:
-        # Skip export if the table does not exist.
-        if not dbcore.table_exists(engine, table):
-            continue
-        geojson_file = export_dir / f"{table}.geojson"
-        runner.run_ogr2ogr_geojson_export(database_url, geojson_file, table)
+    table: str,
+    columns: typing.Mapping[str, str],
+    engine: Engine,
+    profile: TableProfile,
+) -> list[pathlib.Path]:
+    """
+    Export a PostGIS table to a GeoJSON file.
+
+    The features are reprojected to EPSG:4326. GeoJSON only supports one geometry
+    per feature, therefore only the first geometry column of the table is kept.
+    """
+    geojson_file = export_dir / f"{table_name(table)}.geojson"
+    gdf = read_geotable(
+        table, columns, engine, crs=WGS84_SRID, tolerance=profile.tolerance
+    )
+    gdf.to_file(geojson_file, driver="GeoJSON", engine="pyogrio")
+    return [geojson_file]
+
+
+def export_to_parquet(
+    export_dir: pathlib.Path,
+    table: str,
+    columns: typing.Mapping[str, str],
+    engine: Engine,
+    profile: TableProfile,
+) -> list[pathlib.Path]:
+    """
+    Export a PostGIS table to a GeoParquet file.
+
+    The file is compressed with zstd and has a bbox covering column, allowing the
+    readers to filter the features without decoding the geometries.
+    """
+    parquet_file = export_dir / f"{table_name(table)}.parquet"
+    gdf = read_geotable(
+        table, columns, engine, crs=WGS84_SRID, tolerance=profile.tolerance
+    )
+    gdf.to_parquet(parquet_file, compression="zstd", write_covering_bbox=True)
+    return [parquet_file]
+
+
+def export_to_fgb(
+    export_dir: pathlib.Path,
+    table: str,
+    columns: typing.Mapping[str, str],
+    engine: Engine,
+    profile: TableProfile,
+) -> list[pathlib.Path]:
+    """Export a PostGIS table to a FlatGeobuf file with a spatial index."""
+    fgb_file = export_dir / f"{table_name(table)}.fgb"
+    gdf = read_geotable(
+        table, columns, engine, crs=WGS84_SRID, tolerance=profile.tolerance
+    )
+    gdf.to_file(fgb_file, driver="FlatGeobuf", engine="pyogrio", SPATIAL_INDEX="YES")
+    return [fgb_file]
 
 
 def export_to_shp(
     export_dir: pathlib.Path,
-    tables: typing.Sequence[str],
-    database_url: str,
-) -> None:
-    """Export a list of PostGIS tables to Shapefiles."""
-    engine = dbcore.create_psycopg_engine(database_url)
-    for table in tables:
-        # Skip export if the table does not exist.
-        if not dbcore.table_exists(engine, table):
-            continue
-        shapefile = export_dir / f"{table}.shp"
-        runner.run_pgsql2shp(database_url, shapefile, table)
+    table: str,
+    columns: typing.Mapping[str, str],
+    engine: Engine,
+    profile: TableProfile,
+) -> list[pathlib.Path]:
+    """
+    Export a PostGIS table to a Shapefile.
+
+    pgsql2shp is kept for the shapefiles, as it defines the truncated column names
+    the users of these files rely on.
+    """
+    shapefile = export_dir / f"{table_name(table)}.shp"
+    database_url = engine.url.set(drivername="postgresql").render_as_string(
+        hide_password=False,
+    )
+    query = (
+        table
+        if profile == TableProfile()
+        else select_table(table, columns, tolerance=profile.tolerance)
+    )
+    runner.run_pgsql2shp(database_url, shapefile, query)
+    parts = [shapefile.with_suffix(suffix) for suffix in SHAPEFILE_SUFFIXES]
+    return [part for part in parts if part.exists()]
+
+
+def read_geotable(
+    table: str,
+    columns: typing.Mapping[str, str],
+    engine: Engine,
+    crs: int | None = None,
+    tolerance: float | None = None,
+) -> gpd.GeoDataFrame:
+    """
+    Read a PostGIS table into a GeoDataFrame.
+
+    Only the first geometry column is kept, simplified with `tolerance` and
+    reprojected to `crs` if specified.
+    """
+    geometry_columns = [c for c, t in columns.items() if t == "geometry"]
+    if not geometry_columns:
+        raise ValueError(f"the table {table} does not have a geometry column")
+    geometry_column = geometry_columns[0]
+    selection = {c: t for c, t in columns.items() if c not in geometry_columns[1:]}
+    query = select_table(table, selection, crs=crs, tolerance=tolerance)
+    with engine.connect() as conn:
+        gdf = gpd.read_postgis(text(query), conn, geom_col=geometry_column, crs=crs)
+    return arrays_to_json(gdf, selection)
+
+
+def arrays_to_json(
+    gdf: gpd.GeoDataFrame,
+    columns: typing.Mapping[str, str],
+) -> gpd.GeoDataFrame:
+    """
+    Serialize the array columns into JSON strings.
+
+    The arrays are read as Python lists, which the GIS drivers cannot write
+    consistently. As JSON strings, they are written as arrays into the GeoJSON
+    files, like ogr2ogr does, and as JSON fields into the other formats.
+
+    Examples:
+        >>> import shapely
+        >>> gdf = gpd.GeoDataFrame(
+        ...     {"ids": [["a", "b"], None]}, geometry=[shapely.Point(0, 0)] * 2
+        ... )
+        >>> gdf = arrays_to_json(gdf, {"ids": "_varchar", "geometry": "geometry"})
+        >>> gdf["ids"][0]
+        '["a", "b"]'
+    """
+    for column, type_ in columns.items():
+        # The array types are named after their element type, prefixed by "_".
+        if type_.startswith("_"):
+            gdf[column] = gdf[column].map(json.dumps, na_action="ignore")
+    return gdf
+
+
+# Associate the export formats to their exporter.
+EXPORTERS: dict[
+    str,
+    typing.Callable[
+        [pathlib.Path, str, typing.Mapping[str, str], Engine, TableProfile],
+        list[pathlib.Path],
+    ],
+] = {
+    constant.ExportFormat.SHP: export_to_shp,
+    constant.ExportFormat.GEOJSON: export_to_geojson,
+    constant.ExportFormat.CSV: export_to_csv,
+    constant.ExportFormat.PARQUET: export_to_parquet,
+    constant.ExportFormat.FGB: export_to_fgb,
+}
 
 
 def auto_export(
     export_dir: pathlib.Path,
-    tables: typing.Mapping[str, typing.Sequence[str]],
+    tables: typing.Mapping[constant.ExportFormat, typing.Sequence[str]],
     database_url: str,
-) -> None:
+    workers: int = DEFAULT_EXPORT_WORKERS,
+    on_exported: typing.Callable[[list[pathlib.Path]], None] | None = None,
+    profile: constant.ExportProfile = constant.ExportProfile.FULL,
+) -> list[pathlib.Path]:
     """
     Export PostgreSQL/PostGIS tables to their respective files.
 
     Regular tables are exported into CSV files. GIS tables are exported either
-    to geojson or sometimes shapefiles (or both).
+    to geojson or sometimes shapefiles (or both). The export `profile` defines the
+    columns exported and the simplification of the geometries of each table.
+
+    The tables missing from the database are skipped, and the others are exported
+    concurrently by a pool of `workers`. If specified, `on_exported` is called with
+    the files of each table as soon as its export completes.
+
+    :returns: the exported files.
     """
     # Prepare the database connection.
-    engine = dbcore.create_psycopg_engine(database_url)
+    engine = dbcore.get_engine(database_url)
+
+    # Describe the tables to export, skipping the ones that do not exist.
+    descriptions = dbcore.describe_tables(
+        engine, sorted({table for names in tables.values() for table in names})
+    )
 
     # Export the tables per target.
-    export_to_shp(export_dir, tables.get("shp", []), database_url)
-    export_to_geojson(export_dir, tables.get("geojson", []), database_url)
-    export_to_csv(export_dir, tables.get("csv", []), engine)
+    profiles = EXPORT_PROFILES[profile]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for target, names in tables.items():
+            for table in names:
+                qualified_name = resolve_table(descriptions, table)
+                if qualified_name is None:
+                    continue
+                table_profile = profiles.get(table, TableProfile())
+                columns = project_columns(descriptions[qualified_name], table_profile)
+                futures.append(
+                    pool.submit(
+                        EXPORTERS[target],
+                        export_dir,
+                        qualified_name,
+                        columns,
+                        engine,
+                        table_profile,
+                    )
+                )
+        exported = []
+        for future in concurrent.futures.as_completed(futures):
+            files = future.result()
+            if on_exported:
+                on_exported(files)
+            exported.extend(files)
+        return exported
 
 
 def create_calver_directories(
@@ -265,31 +622,127 @@ def calver_revision(dirs: typing.Sequence[pathlib.Path]) -> int:
     return max(with_micro) + 1
 
 
-def bundle(src_dir: pathlib.Path) -> pathlib.Path:
-    """Bundle the content of `src_dir` into a zip file and save it into `src_dir`."""
-    bundle_file = pathlib.Path("bundle.zip")
-    dest = src_dir / bundle_file
-    shutil.make_archive(bundle_file.stem, bundle_file.suffix[1:], src_dir)
-    shutil.move(bundle_file, dest)
-    return dest
+def calver_key(name: str) -> tuple[int, ...] | None:
+    """
+    Build a key ordering the calver directory names.
+
+    Returns None if the name does not follow the calver scheme.
+
+    Examples:
+        >>> calver_key("23.08") < calver_key("23.08.1") < calver_key("23.12")
+        True
+        >>> calver_key("latest") is None
+        True
+    """
+    parts = name.split(".")
+    if not all(part.isdigit() for part in parts):
+        return None
+    return tuple(int(part) for part in parts)
+
+
+def file_sha256(path: pathlib.Path) -> str:
+    """
+    Compute the SHA-256 digest of a file.
+
+    pgsql2shp records the export date in the header of the dBase files, which is
+    left out of their digest so that an unchanged table keeps the same one.
+    """
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        header = f.read(DBF_DATE_BYTES.stop)
+        if path.suffix == ".dbf":
+            blank_date = bytes(len(header[DBF_DATE_BYTES]))
+            header = header[: DBF_DATE_BYTES.start] + blank_date
+        digest.update(header)
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_manifest(export_dir: pathlib.Path, manifest: dict[str, str]) -> pathlib.Path:
+    """Write the manifest associating the exported files to their SHA-256 digest."""
+    manifest_file = export_dir / MANIFEST_FILE
+    manifest_file.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest_file
+
+
+@contextlib.contextmanager
+def open_bundle(
+    dest: pathlib.Path | typing.IO[bytes] | WritableFile,
+    compression: constant.BundleCompression = constant.BundleCompression.DEFLATE,
+) -> typing.Iterator[typing.Callable[[list[pathlib.Path]], None]]:
+    """
+    Open a zip archive bundling the exported files.
+
+    The context yields a function adding files to the archive, which allows to
+    compress each file as soon as it is exported. `dest` can be a path or any
+    writable file object, including the ones writing directly to a store.
+    """
+    with zipfile.ZipFile(
+        dest,
+        mode="w",
+        compression=BUNDLE_COMPRESSIONS[compression],
+    ) as archive:
+
+        def add(files: list[pathlib.Path]) -> None:
+            for file in files:
+                archive.write(file, arcname=file.name)
+
+        yield add
 
 
 def local_files(
     database_url: str,
     export_dir: pathlib.Path,
     *,
+    formats: typing.Sequence[constant.ExportFormat] = constant.EXPORT_FORMATS_DEFAULT,
     with_bundle: bool = False,
+    bundle_compression: constant.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: constant.ExportProfile = constant.ExportProfile.FULL,
+    bundle_to: typing.IO[bytes] | WritableFile | None = None,
+    with_manifest: bool = True,
+    on_exported: typing.Callable[[list[pathlib.Path]], None] | None = None,
 ) -> None:
-    """Export result files into a local directory."""
+    """
+    Export result files into a local directory.
+
+    The bundle is written into `bundle_to` if specified, otherwise into
+    `export_dir`. The manifest lists the SHA-256 digest of the exported files,
+    the bundle excepted.
+    """
     # Prepare the output directory.
     export_dir.mkdir(parents=True, exist_ok=True)
 
-    # Export the catalogued tables to their associated format.
-    auto_export(export_dir.resolve(strict=True), TABLE_CATALOG, database_url)
+    # Bundle the result files into a zip file as they get exported if needed.
+    bundler = (
+        open_bundle(bundle_to or export_dir / BUNDLE_FILE, bundle_compression)
+        if with_bundle
+        else contextlib.nullcontext()
+    )
+    manifest: dict[str, str] = {}
+    with bundler as add_to_bundle:
+
+        def exported(files: list[pathlib.Path]) -> None:
+            if with_manifest:
+                manifest.update({file.name: file_sha256(file) for file in files})
+            if add_to_bundle:
+                add_to_bundle(files)
+            if on_exported:
+                on_exported(files)
+
+        # Export the catalogued tables to the requested formats.
+        tables = {format_: TABLE_CATALOG[format_] for format_ in formats}
+        auto_export(
+            export_dir.resolve(strict=True),
+            tables,
+            database_url,
+            on_exported=exported,
+            profile=profile,
+        )
 
-    # Bundle the result files into a zip file if needed.
-    if with_bundle:
-        bundle(export_dir)
+    # Write the manifest.
+    if with_manifest:
+        write_manifest(export_dir, manifest)
 
 
 def get_s3_bucket(bucket_name: str) -> typing.Any:
@@ -355,6 +808,27 @@ def calver_directory_s3(
     return s3_dir
 
 
+def previous_calver_directory_s3(
+    bucket: typing.Any,
+    country: str,
+    city: str,
+    region: str | None = None,
+) -> pathlib.Path | None:
+    """Find the latest calver directory of a city having a manifest in the bucket."""
+    city_dir = calver_base(country, city, region).parent
+    directories = [
+        pathlib.Path(obj.key).parent
+        for obj in bucket.objects.filter(Prefix=f"{city_dir}/")
+        if obj.key.endswith(f"/{MANIFEST_FILE}")
+    ]
+    calvers = {
+        d: key
+        for d in directories
+        if d.parent == city_dir and (key := calver_key(d.name)) is not None
+    }
+    return max(calvers, key=calvers.__getitem__, default=None)
+
+
 def mkdir_calver_directory_s3(
     bucket: typing.Any,
     country: str,
@@ -426,42 +900,197 @@ def create_r2_store(
     )  # ty:ignore[no-matching-overload]
 
 
-async def upload_file(store: ObjectStore, path: pathlib.Path) -> None:
-    """Upload a file to the store."""
-    await store.put_async(str(path), path)
+def store_key(prefix: str, name: str) -> str:
+    """
+    Build the key of a file in a store directory.
 
+    Examples:
+        >>> store_key("usa/tx/austin/23.08", "mileage.csv")
+        'usa/tx/austin/23.08/mileage.csv'
+        >>> store_key(".", "mileage.csv")
+        'mileage.csv'
+    """
+    return str(pathlib.PurePosixPath(prefix, name))
 
-async def export_to_store(
+
+async def read_manifest(store: ObjectStore, prefix: str) -> dict[str, str]:
+    """Read the manifest of a store directory, returning an empty one if missing."""
+    try:
+        resp = await store.get_async(store_key(prefix, MANIFEST_FILE))
+    except FileNotFoundError:
+        logger.warning(f"No manifest found in {prefix}, all the files will be uploaded")
+        return {}
+    return json.loads(bytes(await resp.bytes_async()))
+
+
+async def upload_file(
+    store: ObjectStore,
+    path: pathlib.Path,
+    key: str | None = None,
+    *,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> None:
+    """
+    Upload a file to the store.
+
+    The files larger than `chunk_size` are sent with a multipart upload, and the
+    upload is retried with an exponential backoff in case of transient failure.
+
+    The file is stored under `key`, defaulting to its name.
+    """
+    retrying = tenacity.AsyncRetrying(
+        retry=tenacity.retry_if_exception_type(GenericError),
+        stop=tenacity.stop_after_attempt(UPLOAD_ATTEMPTS),
+        wait=tenacity.wait_exponential(multiplier=1, max=30),
+        before_sleep=lambda state: logger.warning(
+            f"Upload of {path.name} failed (attempt {state.attempt_number}), "
+            "retrying..."
+        ),
+        reraise=True,
+    )
+    # Runs under asyncio (not trio) on a local file, so a plain sync stat is used.
+    size = path.stat().st_size  # noqa: ASYNC240
+    async for attempt in retrying:
+        with attempt:
+            await store.put_async(
+                key or path.name,
+                path,
+                use_multipart=size > chunk_size,
+                chunk_size=chunk_size,
+            )
+
+
+def export_and_bundle(
     store: ObjectStore,
     database_url: str,
+    export_dir: pathlib.Path,
     *,
+    prefix: str = "",
+    formats: typing.Sequence[constant.ExportFormat] = constant.EXPORT_FORMATS_DEFAULT,
     with_bundle: bool = False,
+    bundle_compression: constant.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: constant.ExportProfile = constant.ExportProfile.FULL,
+    on_exported: typing.Callable[[list[pathlib.Path]], None] | None = None,
 ) -> None:
-    """Export PostgreSQL/PostGIS tables to a store."""
-    # Create a temporary directory to export the files.
-    with tempfile.TemporaryDirectory() as tmpdir_name:
-        tmpdir = pathlib.Path(tmpdir_name)
+    """Export the result files into `export_dir` and stream their bundle to a store."""
+    writer = (
+        obstore.open_writer(
+            store, store_key(prefix, BUNDLE_FILE), buffer_size=UPLOAD_CHUNK_SIZE
+        )
+        if with_bundle
+        else contextlib.nullcontext()
+    )
+    with writer as bundle_to:
         local_files(
             database_url=database_url,
-            export_dir=tmpdir,
+            export_dir=export_dir,
+            formats=formats,
             with_bundle=with_bundle,
+            bundle_compression=bundle_compression,
+            profile=profile,
+            bundle_to=bundle_to,
+            with_manifest=False,
+            on_exported=on_exported,
+        )
+
+
+async def export_to_store(
+    store: ObjectStore,
+    database_url: str,
+    *,
+    prefix: str = "",
+    previous: str | None = None,
+    formats: typing.Sequence[constant.ExportFormat] = constant.EXPORT_FORMATS_DEFAULT,
+    with_bundle: bool = False,
+    bundle_compression: constant.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: constant.ExportProfile = constant.ExportProfile.FULL,
+    workers: int = DEFAULT_UPLOAD_WORKERS,
+) -> None:
+    """
+    Export PostgreSQL/PostGIS tables to a store.
+
+    The tables are exported into a temporary directory, and the files of each table
+    are uploaded into the `prefix` directory as soon as its export completes, by at
+    most `workers` concurrent uploads.
+
+    If a `previous` directory is specified, the files whose digest matches the one
+    of its manifest are copied within the store instead of being uploaded.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(workers)
+    uploads: list[asyncio.Task[None]] = []
+    uploaded: list[pathlib.Path] = []
+    copied: list[pathlib.Path] = []
+    manifest: dict[str, str] = {}
+    previous_manifest = (
+        await read_manifest(store, previous) if previous is not None else {}
+    )
+
+    async def upload(file: pathlib.Path) -> None:
+        digest = await asyncio.to_thread(file_sha256, file)
+        manifest[file.name] = digest
+        key = store_key(prefix, file.name)
+        async with semaphore:
+            if previous and previous_manifest.get(file.name) == digest:
+                logger.debug(f"Copying unchanged {file.name} from {previous}...")
+                await store.copy_async(store_key(previous, file.name), key)
+                copied.append(file)
+            else:
+                logger.debug(f"Uploading {file.name} to the store...")
+                await upload_file(store, file, key)
+                uploaded.append(file)
+        logger.debug(
+            f"Stored {file.name} ({len(uploaded) + len(copied)}/{len(uploads)} files)."
         )
 
-        # Create a local store.
-        local_store = from_url(f"file://{tmpdir}")
+    def schedule(files: list[pathlib.Path]) -> None:
+        uploads.extend(loop.create_task(upload(file)) for file in files)
 
-        # Upload each file sequentially.
-        # Runs under asyncio (not trio), and `tmpdir` is a local, short-lived
-        # directory, so plain sync pathlib calls are used instead of trio.Path.
-        for file in tmpdir.iterdir():  # noqa: ASYNC240
-            # Skip directories and non-files.
-            if not file.is_file():
-                continue
+    def exported(files: list[pathlib.Path]) -> None:
+        # Called from the export thread.
+        loop.call_soon_threadsafe(schedule, files)
 
-            # Stream the file from the local store to the destination store.
-            logger.debug(f"Uploading {file.name} to the store...")
-            resp = await local_store.get_async(file.name)
-            await store.put_async(file.name, resp)
+    # Create a temporary directory to export the files.
+    with tempfile.TemporaryDirectory() as tmpdir_name:
+        tmpdir = pathlib.Path(tmpdir_name)
+        try:
+            # Export the tables in a worker thread, scheduling the uploads from the
+            # event loop as the tables get exported. The bundle is streamed to the
+            # store while it is being written.
+            await loop.run_in_executor(
+                None,
+                functools.partial(
+                    export_and_bundle,
+                    store,
+                    database_url,
+                    tmpdir,
+                    prefix=prefix,
+                    formats=formats,
+                    with_bundle=with_bundle,
+                    bundle_compression=bundle_compression,
+                    profile=profile,
+                    on_exported=exported,
+                ),
+            )
+
+            # Wait for the remaining uploads.
+            await asyncio.gather(*uploads)
+        except BaseException:
+            # Do not leave uploads running while the directory gets deleted.
+            for task in uploads:
+                task.cancel()
+            await asyncio.gather(*uploads, return_exceptions=True)
+            raise
+
+    # Upload the manifest last, so it only exists for complete exports.
+    await store.put_async(
+        store_key(prefix, MANIFEST_FILE),
+        json.dumps(manifest, indent=2, sort_keys=True).encode(),
+    )
+    logger.info(
+        f"Uploaded {len(uploaded)} files to the store, "
+        f"copied {len(copied)} unchanged ones."
+    )
 
 
 async def export_to_s3_with_calver(
@@ -471,12 +1100,26 @@ async def export_to_s3_with_calver(
     city: str,
     region: str | None = None,
     *,
+    formats: typing.Sequence[constant.ExportFormat] = constant.EXPORT_FORMATS_DEFAULT,
     with_bundle: bool = False,
+    bundle_compression: constant.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: constant.ExportProfile = constant.ExportProfile.FULL,
+    delta: bool = False,
 ) -> pathlib.Path:
-    """Export PostgreSQL/PostGIS tables to a folder following the calver convention."""
+    """
+    Export PostgreSQL/PostGIS tables to a folder following the calver convention.
+
+    In `delta` mode, the files unchanged since the previous calver release of the
+    city are copied from it instead of being uploaded.
+    """
     # Get the S3 bucket.
     bucket = get_s3_bucket(bucket_name)
 
+    # Find the previous release to compare the files with.
+    previous = (
+        previous_calver_directory_s3(bucket, country, city, region) if delta else None
+    )
+
     # Create the calver directory in the store.
     folder = mkdir_calver_directory_s3(bucket, country, city, region)
     logger.debug(
@@ -489,7 +1132,11 @@ async def export_to_s3_with_calver(
         bucket_name=bucket_name,
         folder=folder,
         database_url=database_url,
+        formats=formats,
         with_bundle=with_bundle,
+        bundle_compression=bundle_compression,
+        profile=profile,
+        previous=previous,
     )
 
 
@@ -498,7 +1145,10 @@ async def export_to_s3_with_custom_dir(
     database_url: str,
     custom_dir: pathlib.Path,
     *,
+    formats: typing.Sequence[constant.ExportFormat] = constant.EXPORT_FORMATS_DEFAULT,
     with_bundle: bool = False,
+    bundle_compression: constant.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: constant.ExportProfile = constant.ExportProfile.FULL,
 ) -> pathlib.Path:
     """Export PostgreSQL/PostGIS tables to a custom directory."""
     # Get the S3 bucket.
@@ -512,7 +1162,10 @@ async def export_to_s3_with_custom_dir(
         bucket_name=bucket_name,
         folder=custom_dir,
         database_url=database_url,
+        formats=formats,
         with_bundle=with_bundle,
+        bundle_compression=bundle_compression,
+        profile=profile,
     )
 
 
@@ -521,12 +1174,29 @@ async def export_to_s3(
     folder: pathlib.Path,
     database_url: str,
     *,
+    formats: typing.Sequence[constant.ExportFormat] = constant.EXPORT_FORMATS_DEFAULT,
     with_bundle: bool = False,
+    bundle_compression: constant.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: constant.ExportProfile = constant.ExportProfile.FULL,
+    previous: pathlib.Path | None = None,
 ) -> pathlib.Path:
-    """Export PostgreSQL/PostGIS tables to a S3 directory."""
+    """
+    Export PostgreSQL/PostGIS tables to a S3 directory.
+
+    The files unchanged since the `previous` directory are copied from it.
+    """
     # Export the files to the store.
-    store = create_s3_store(bucket_name, folder)
-    await export_to_store(store, database_url, with_bundle=with_bundle)
+    store = create_s3_store(bucket_name)
+    await export_to_store(
+        store,
+        database_url,
+        prefix=folder.as_posix(),
+        previous=previous.as_posix() if previous else None,
+        formats=formats,
+        with_bundle=with_bundle,
+        bundle_compression=bundle_compression,
+        profile=profile,
+    )
     return folder
 
 
@@ -537,12 +1207,26 @@ async def export_to_r2_with_calver(
     city: str,
     region: str | None = None,
     *,
+    formats: typing.Sequence[constant.ExportFormat] = constant.EXPORT_FORMATS_DEFAULT,
     with_bundle: bool = False,
+    bundle_compression: constant.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: constant.ExportProfile = constant.ExportProfile.FULL,
+    delta: bool = False,
 ) -> pathlib.Path:
-    """Export PostgreSQL/PostGIS tables to a folder following the calver convention."""
+    """
+    Export PostgreSQL/PostGIS tables to a folder following the calver convention.
+
+    In `delta` mode, the files unchanged since the previous calver release of the
+    city are copied from it instead of being uploaded.
+    """
     # Get the R2 bucket.
     bucket = get_r2_bucket(bucket_name)
 
+    # Find the previous release to compare the files with.
+    previous = (
+        previous_calver_directory_s3(bucket, country, city, region) if delta else None
+    )
+
     # Create the calver directory in the store.
     folder = mkdir_calver_directory_s3(bucket, country, city, region)
 
@@ -551,7 +1235,11 @@ async def export_to_r2_with_calver(
         bucket_name=bucket_name,
         folder=folder,
         database_url=database_url,
+        formats=formats,
         with_bundle=with_bundle,
+        bundle_compression=bundle_compression,
+        profile=profile,
+        previous=previous,
     )
 
 
@@ -560,7 +1248,10 @@ async def export_to_r2_with_custom_dir(
     database_url: str,
     custom_dir: pathlib.Path,
     *,
+    formats: typing.Sequence[constant.ExportFormat] = constant.EXPORT_FORMATS_DEFAULT,
     with_bundle: bool = False,
+    bundle_compression: constant.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: constant.ExportProfile = constant.ExportProfile.FULL,
 ) -> pathlib.Path:
     """Export PostgreSQL/PostGIS tables to a custom directory."""
     # Get the R2 bucket.
@@ -574,7 +1265,10 @@ async def export_to_r2_with_custom_dir(
         bucket_name=bucket_name,
         folder=custom_dir,
         database_url=database_url,
+        formats=formats,
         with_bundle=with_bundle,
+        bundle_compression=bundle_compression,
+        profile=profile,
     )
 
 
@@ -583,10 +1277,27 @@ async def export_to_r2(
     folder: pathlib.Path,
     database_url: str,
     *,
+    formats: typing.Sequence[constant.ExportFormat] = constant.EXPORT_FORMATS_DEFAULT,
     with_bundle: bool = False,
+    bundle_compression: constant.BundleCompression = constant.BundleCompression.DEFLATE,
+    profile: constant.ExportProfile = constant.ExportProfile.FULL,
+    previous: pathlib.Path | None = None,
 ) -> pathlib.Path:
-    """Export PostgreSQL/PostGIS tables to a R2 directory."""
+    """
+    Export PostgreSQL/PostGIS tables to a R2 directory.
+
+    The files unchanged since the `previous` directory are copied from it.
+    """
     # Export the files to the store.
-    store = create_r2_store(bucket_name, folder)
-    await export_to_store(store, database_url, with_bundle=with_bundle)
+    store = create_r2_store(bucket_name)
+    await export_to_store(
+        store,
+        database_url,
+        prefix=folder.as_posix(),
+        previous=previous.as_posix() if previous else None,
+        formats=formats,
+        with_bundle=with_bundle,
+        bundle_compression=bundle_compression,
+        profile=profile,
+    )
     return folder
@@ -1,7 +1,11 @@
 """Define functions that will be use to ingest the data."""
 
+import csv
+import hashlib
+import itertools
 import pathlib
 import subprocess
+from collections import abc
 from enum import Enum
 from importlib import resources
 
@@ -13,6 +17,7 @@ from sqlalchemy.engine import Engine
 from brokenspoke_analyzer.cli import common
 from brokenspoke_analyzer.core import (
     analysis,
+    constant,
     downloader,
     runner,
     utils,
@@ -22,8 +27,9 @@ from brokenspoke_analyzer.core.database import dbcore
 # Define table constants.
 BOUNDARY_TABLE = "neighborhood_boundary"
 CENSUS_BLOCKS_TABLE = "neighborhood_census_blocks"
-CITY_SPEED_TABLE = "city_speed"
-STATE_SPEED_TABLE = "state_speed"
+# Position of the FIPS code column in the speed limit CSV files.
+CITY_SPEED_FIPS_COLUMN = 2
+STATE_SPEED_FIPS_COLUMN = 1
 RESIDENTIAL_SPEED_LIMIT_TABLE = "residential_speed_limit"
 script_dir = resources.files("brokenspoke_analyzer.scripts")
 
@@ -272,24 +278,65 @@ async def import_jobs(
         load_jobs(engine, part, csvfile)
 
 
-def retrieve_state_speed_limit(engine: Engine, state_fips: str) -> str | None:
-    """Retrieve the state speed limit from the imported speed limit data."""
-    query = f"SELECT speed FROM state_speed WHERE fips_code_state = '{state_fips}';"
-    return retrieve_speed_limit(engine, query)
+def parse_speed_limits(
+    lines: abc.Iterable[str],
+    fips_column: int,
+) -> dict[str, int | None]:
+    """
+    Parse speed limit CSV lines into a lookup table keyed by FIPS code.
+
+    The header line is skipped and the speed is expected in the last column. If a
+    FIPS code appears several times, the first occurrence wins.
+
+    Examples:
+        >>> parse_speed_limits(["state,fips_code_state,speed", "AZ,04,25"], 1)
+        {'04': 25}
+
+        >>> parse_speed_limits(
+        ...     [
+        ...         "city,state,fips_code_city,speed",
+        ...         "Flagstaff,AZ,0423620 ,",
+        ...         "Santa Rosa,NM,3570670,30",
+        ...         "Santa Rosa,NM,3570670,40",
+        ...     ],
+        ...     2,
+        ... )
+        {'0423620': None, '3570670': 30}
+    """
+    speed_limits: dict[str, int | None] = {}
+    for row in itertools.islice(csv.reader(lines), 1, None):
+        if not row:
+            continue
+        speed = row[-1].strip()
+        speed_limits.setdefault(row[fips_column].strip(), int(speed) if speed else None)
+    return speed_limits
 
 
-def retrieve_city_speed_limit(engine: Engine, city_fips: str) -> str | None:
-    """Retrieve the city speed limit from the imported speed limit data."""
-    query = f"SELECT speed FROM city_speed WHERE fips_code_city = '{city_fips}';"
-    return retrieve_speed_limit(engine, query)
+# Speed limit lookup tables, indexed by the checksum of their CSV file.
+_SPEED_LIMITS: dict[tuple[str, int], dict[str, int | None]] = {}
 
 
-def retrieve_speed_limit(engine: Engine, query: str) -> str | None:
-    """Retrieve the speed limit from the imported speed limit data."""
-    with engine.connect() as conn:
-        result = conn.execute(text(query))
-        row = result.first()
-        return str(row.speed).strip() if row else None
+def read_speed_limits(csvfile: pathlib.Path, fips_column: int) -> dict[str, int | None]:
+    """
+    Read a speed limit CSV file into a lookup table keyed by FIPS code.
+
+    The lookup tables are kept for the duration of the process, therefore the
+    cities of a batch share them, even if each city has its own copy of the file.
+    """
+    content = csvfile.read_bytes()
+    key = (hashlib.sha256(content).hexdigest(), fips_column)
+    if key not in _SPEED_LIMITS:
+        _SPEED_LIMITS[key] = parse_speed_limits(
+            content.decode().splitlines(), fips_column
+        )
+    return _SPEED_LIMITS[key]
+
+
+def create_speed_tables(engine: Engine) -> None:
+    """Create the speed tables if they do not exist."""
+    sql_script_dir = pathlib.Path(script_dir._paths[0]) / "sql"  # ty:ignore[unresolved-attribute]
+    speed_table_script = sql_script_dir / "speed_tables.sql"
+    dbcore.execute_sql_file(engine, speed_table_script)
 
 
 def manage_speed_limits(
@@ -302,36 +349,30 @@ def manage_speed_limits(
 ) -> None:
     """Manage the state and city speed limits.."""
     # Prepare speed tables.
-    sql_script_dir = pathlib.Path(script_dir._paths[0]) / "sql"  # ty:ignore[unresolved-attribute]
-    speed_table_script = sql_script_dir / "speed_tables.sql"
-    dbcore.execute_sql_file(engine, speed_table_script)
+    create_speed_tables(engine)
 
     # Manage state speed limit.
-    logger.info("Importing state speed limits...")
+    logger.info("Looking up state speed limits...")
     state_default_speed_limit = None
     if state_fips != runner.NON_US_STATE_FIPS:
-        dbcore.import_csv_file_with_header(
-            engine,
-            state_speed_limits_csv,
-            STATE_SPEED_TABLE,
+        state_speed_limits = read_speed_limits(
+            state_speed_limits_csv, STATE_SPEED_FIPS_COLUMN
         )
-        state_default_speed_limit = retrieve_state_speed_limit(engine, state_fips)
+        state_default_speed_limit = state_speed_limits.get(state_fips.strip())
     logger.debug(
         f'The speed limit for the state "{state_fips}" is {state_default_speed_limit}.',
     )
 
     # Manage city speed limit.
-    logger.info("Importing city speed limits...")
+    logger.info("Looking up city speed limits...")
     city_default_speed_limit = None
     if city_speed_limit_override:
-        city_default_speed_limit = city_speed_limit_override
+        city_default_speed_limit = int(city_speed_limit_override)
     else:
-        dbcore.import_csv_file_with_header(
-            engine,
-            city_speed_limits_csv,
-            CITY_SPEED_TABLE,
+        city_speed_limits = read_speed_limits(
+            city_speed_limits_csv, CITY_SPEED_FIPS_COLUMN
         )
-        city_default_speed_limit = retrieve_city_speed_limit(engine, city_fips)
+        city_default_speed_limit = city_speed_limits.get(city_fips.strip())
     logger.debug(
         f'The speed limit for the city "{city_fips}" is {city_default_speed_limit}.',
     )
@@ -340,11 +381,19 @@ def manage_speed_limits(
     logger.info("Saving speed limits into the database...")
     query = (
         f"INSERT INTO {RESIDENTIAL_SPEED_LIMIT_TABLE} "
-        "(state_fips_code, city_fips_code, state_speed,city_speed) "
-        f"VALUES ({state_fips}, {city_fips}, {state_default_speed_limit or 'NULL'}, "
-        f"{city_default_speed_limit or 'NULL'});"
+        "(state_fips_code, city_fips_code, state_speed, city_speed) "
+        "VALUES (:state_fips, :city_fips, :state_speed, :city_speed);"
     )
-    dbcore.execute_query(engine, query)
+    with engine.begin() as conn:
+        conn.execute(
+            text(query),
+            {
+                "state_fips": state_fips,
+                "city_fips": city_fips,
+                "state_speed": state_default_speed_limit,
+                "city_speed": city_default_speed_limit,
+            },
+        )
 
     # Validate data to prevent moving forward with corrupted values.
     logger.info("Validating the speed data...")
@@ -365,8 +414,13 @@ def retrieve_default_speed_limits(engine: Engine) -> tuple[int | None, int | Non
         raise ValueError(f"no value found in the {RESIDENTIAL_SPEED_LIMIT_TABLE} table")
 
 
-def rename_neighborhood_tables(engine: Engine) -> None:
-    """Rename neighborhood tables."""
+def rename_neighborhood_tables(engine: Engine, *, with_cycleways: bool = True) -> None:
+    """
+    Rename neighborhood tables.
+
+    The cycleway tables only exist when the OSM data was imported with the split
+    strategy.
+    """
     query = (
         "ALTER TABLE received.neighborhood_ways_vertices_pgr "
         "RENAME TO neighborhood_ways_intersections;"
@@ -376,10 +430,28 @@ def rename_neighborhood_tables(engine: Engine) -> None:
         "RENAME CONSTRAINT neighborhood_ways_vertices_pgr_osm_id_key "
         "TO neighborhood_vertex_id;"
     )
-    query += (
-        "ALTER TABLE scratch.neighborhood_cycwys_ways_vertices_pgr "
-        "RENAME CONSTRAINT neighborhood_cycwys_ways_vertices_pgr_osm_id_key "
-        "TO neighborhood_vertex_id;"
+    if with_cycleways:
+        query += (
+            "ALTER TABLE scratch.neighborhood_cycwys_ways_vertices_pgr "
+            "RENAME CONSTRAINT neighborhood_cycwys_ways_vertices_pgr_osm_id_key "
+            "TO neighborhood_vertex_id;"
+        )
+    dbcore.execute_query(engine, query)
+
+
+def create_empty_cycleway_table(engine: Engine) -> None:
+    """
+    Create an empty cycleway table.
+
+    With the consolidated strategy, the cycleways are imported along with the
+    highways. The `prepare_tables.sql` script still expects the table holding the
+    cycleways the first osm2pgrouting pass used to miss, therefore we create it
+    empty.
+    """
+    query = (
+        "DROP TABLE IF EXISTS scratch.neighborhood_cycwys_ways;"
+        "CREATE TABLE scratch.neighborhood_cycwys_ways "
+        "(LIKE received.neighborhood_ways);"
     )
     dbcore.execute_query(engine, query)
 
@@ -393,6 +465,52 @@ def move_tables(engine: Engine) -> None:
     dbcore.execute_query(engine, query)
 
 
+def _import_routable_ways(
+    engine: Engine,
+    database_url: str,
+    osm_file: pathlib.Path,
+    osm_import_mode: constant.OSMImportMode,
+) -> None:
+    """Import the routable ways with osm2pgrouting."""
+    dir_ = pathlib.Path(script_dir._paths[0])  # ty:ignore[unresolved-attribute]
+    split = osm_import_mode == constant.OSMImportMode.SPLIT
+    if split:
+        # Import the osm with highways.
+        logger.info("Importing OSM data with highways...")
+        runner.run_osm2pgrouting(
+            database_url,
+            "received",
+            "neighborhood_",
+            dir_ / "mapconfig_highway.xml",
+            osm_file,
+            pgoptions=dbcore.workload_pgoptions(),
+        )
+
+        # Import the osm with cycleways that the above misses (bug in osm2pgrouting).
+        # Note(rgreinho): is this still true?
+        logger.info("Importing OSM data with cycleways...")
+        runner.run_osm2pgrouting(
+            database_url,
+            "scratch",
+            "neighborhood_cycwys_",
+            dir_ / "mapconfig_cycleway.xml",
+            osm_file,
+            pgoptions=dbcore.workload_pgoptions(),
+        )
+    else:
+        # Import the osm with highways and cycleways at once.
+        logger.info("Importing OSM data with highways and cycleways...")
+        runner.run_osm2pgrouting(
+            database_url,
+            "received",
+            "neighborhood_",
+            dir_ / "mapconfig_highway_cycleway.xml",
+            osm_file,
+            pgoptions=dbcore.workload_pgoptions(),
+        )
+        create_empty_cycleway_table(engine)
+
+
 def import_osm_data(
     engine: Engine,
     osm_file: pathlib.Path,
@@ -402,61 +520,70 @@ def import_osm_data(
     state_speed_limits_csv: pathlib.Path,
     city_speed_limits_csv: pathlib.Path,
     city_speed_limit_override: str | None = None,
+    osm_import_mode: constant.OSMImportMode = constant.OSMImportMode.SPLIT,
 ) -> None:
     """
     Import data related to OSM.
 
     Remark: can only be run afer `import_neighborhood()`. It requires some table to
     exist to compute the boundary box.
+
+    With the `SPLIT` strategy, osm2pgrouting parses the OSM file twice: once for
+    the highways and once for the cycleways it used to miss. The `CONSOLIDATED`
+    strategy merges both configurations and imports the routable ways in a single
+    pass.
     """
     database_url = engine.engine.url.set(drivername="postgresql").render_as_string(
         hide_password=False,
     )
 
     # Define the BBOX and clip the data.
-    # Note(rgreinho): Normally these 2 steps are useless now since we clip the
-    # data during the "prepare" phase. But we still need to validate this hypothesis.
-    logger.debug("Clipping the OSM data...")
+    # The data is already clipped to the city boundaries during the "prepare"
+    # phase, therefore the extract is reused as is when its data, including the
+    # complete ways crossing the boundaries, fits within the census blocks. It is
+    # only clipped again when it is not described or overflows them.
     bbox = retrieve_boundary_box(engine)
     logger.debug(f"{bbox=}")
-    clipped_osm_file = runner.run_osm_convert(osm_file, bbox)
-
-    # Ensure the file does not have backslashes.
-    # Note(rgreinho): do we still need this step too?
-
-    # Import the osm with highways.
-    dir_ = pathlib.Path(script_dir._paths[0])  # ty:ignore[unresolved-attribute]
-    logger.info("Importing OSM data with highways...")
-    runner.run_osm2pgrouting(
-        database_url,
-        "received",
-        "neighborhood_",
-        dir_ / "mapconfig_highway.xml",
-        clipped_osm_file,
-    )
-
-    # Import the osm with cycleways that the above misses (bug in osm2pgrouting).
-    # Note(rgreinho): is this still true?
-    logger.info("Importing OSM data with cycleways...")
-    runner.run_osm2pgrouting(
-        database_url,
-        "scratch",
-        "neighborhood_cycwys_",
-        dir_ / "mapconfig_cycleway.xml",
-        clipped_osm_file,
-    )
+    extract_bbox = analysis.read_extract_bbox(osm_file)
+    logger.debug(f"{extract_bbox=}")
+    if extract_bbox and analysis.bbox_within(extract_bbox, bbox):
+        logger.debug("The OSM data is within the census blocks, skipping clipping.")
+        clipped_osm_file = osm_file
+    else:
+        logger.debug("Clipping the OSM data...")
+        clipped_osm_file = runner.run_osmium_extract_bbox(osm_file, bbox)
+
+    # osm2pgrouting only reads OSM XML, therefore a temporary copy is converted
+    # from the PBF extract and removed as soon as it is imported. The copy is
+    # written to disk since osm2pgrouting scans the file before parsing it, so it
+    # cannot read from a pipe.
+    if clipped_osm_file.suffix == ".pbf":
+        xml_osm_file = clipped_osm_file.with_suffix("")
+        logger.debug(f"Converting the OSM data to XML: {xml_osm_file}")
+        runner.run_osmium_cat(clipped_osm_file, xml_osm_file)
+        try:
+            _import_routable_ways(engine, database_url, xml_osm_file, osm_import_mode)
+        finally:
+            xml_osm_file.unlink(missing_ok=True)
+    else:
+        _import_routable_ways(engine, database_url, clipped_osm_file, osm_import_mode)
 
     # Rename a few tables.
     logger.info("Renaming tables...")
-    rename_neighborhood_tables(engine)
+    rename_neighborhood_tables(
+        engine,
+        with_cycleways=osm_import_mode == constant.OSMImportMode.SPLIT,
+    )
 
     # Import full osm to fill out additional data needs not met by osm2pgrouting.
     logger.info("Importing all OSM data...")
+    dir_ = pathlib.Path(script_dir._paths[0])  # ty:ignore[unresolved-attribute]
     runner.run_osm2pgsql(
         database_url,
         output_srid,
         dir_ / "pfb.style",
         clipped_osm_file,
+        pgoptions=dbcore.workload_pgoptions(),
     )
 
     # Manage speed limits.
@@ -485,6 +612,7 @@ async def import_all(
     state: str | None = None,
     lodes_year: int | None = None,
     city_speed_limit_override: str | None = None,
+    osm_import_mode: constant.OSMImportMode = constant.OSMImportMode.SPLIT,
 ) -> None:
     """Import all the data."""
     import_neighborhood(
@@ -507,6 +635,7 @@ async def import_all(
         state_speed_limits_csv,
         city_speed_limits_csv,
         city_speed_limit_override,
+        osm_import_mode,
     )
 
 
@@ -532,7 +661,7 @@ def neighborhood_wrapper(
         raise ValueError("`state` is required for US cities")
 
     # Prepare the database connection.
-    engine = dbcore.create_psycopg_engine(database_url)
+    engine = dbcore.get_engine(database_url)
 
     # Prepare the files to import.
     _, _, slug = analysis.osmnx_query(country, city, region)
@@ -573,7 +702,7 @@ async def jobs_wrapper(
         raise ValueError("a state abbreviation must be 2 letter long")
 
     # Prepare the database connection.
-    engine = dbcore.create_psycopg_engine(database_url)
+    engine = dbcore.get_engine(database_url)
 
     # Import the jobs.
     await import_jobs(engine, state_abbreviation, lodes_year, data_dir)
@@ -587,6 +716,7 @@ def osm_wrapper(
     database_url: str,
     fips_code: str,
     region: str,
+    osm_import_mode: constant.OSMImportMode = constant.OSMImportMode.SPLIT,
 ) -> None:
     """
     Wrap the `import_osm_data` function.
@@ -595,7 +725,7 @@ def osm_wrapper(
     cannot be computed.
     """
     # Prepare the database connection.
-    engine = dbcore.create_psycopg_engine(database_url)
+    engine = dbcore.get_engine(database_url)
 
     # Handles us/usa as the same country.
     country = utils.normalize_country_name(country)
@@ -603,7 +733,7 @@ def osm_wrapper(
     # Prepare the files to import.
     _, _, slug = analysis.osmnx_query(country, city, region)
     boundary_file = data_dir / f"{slug}.shp"
-    osm_file = data_dir / f"{slug}.osm"
+    osm_file = data_dir / f"{slug}.osm.pbf"
     state_speed_limits_csv = data_dir / "state_fips_speed.csv"
     city_speed_limits_csv = data_dir / "city_fips_speed.csv"
 
@@ -623,6 +753,7 @@ def osm_wrapper(
         fips_code,
         state_speed_limits_csv,
         city_speed_limits_csv,
+        osm_import_mode=osm_import_mode,
     )
 
 
@@ -635,6 +766,7 @@ async def all_wrapper(
     fips_code: str = common.DEFAULT_CITY_FIPS_CODE,
     region: str,
     lodes_year: int | None = None,
+    osm_import_mode: constant.OSMImportMode = constant.OSMImportMode.SPLIT,
 ) -> None:
     """
     Wrap the all the `import_*` functions.
@@ -642,31 +774,35 @@ async def all_wrapper(
     Wrap the all the `import_*` functions to allow calling them with only parameters
     that cannot be computed.
     """
-    # Import neighborhood data.
-    neighborhood_wrapper(
-        city=city,
-        country=country,
-        data_dir=data_dir,
-        database_url=database_url,
-        region=region,
-    )
-
-    # Import job data.
-    state_abbreviation, _, import_jobs = analysis.derive_state_info(region)
-    if import_jobs:
-        await jobs_wrapper(
+    # Tune the database for bulk loads.
+    engine = dbcore.get_engine(database_url)
+    with dbcore.workload(engine, constant.Workload.LOAD):
+        # Import neighborhood data.
+        neighborhood_wrapper(
+            city=city,
+            country=country,
             data_dir=data_dir,
             database_url=database_url,
-            lodes_year=lodes_year,
-            state_abbreviation=state_abbreviation,
+            region=region,
         )
 
-    # Import OSM data.
-    osm_wrapper(
-        city=city,
-        country=country,
-        data_dir=data_dir,
-        database_url=database_url,
-        fips_code=fips_code,
-        region=region,
-    )
+        # Import job data.
+        state_abbreviation, _, import_jobs = analysis.derive_state_info(region)
+        if import_jobs:
+            await jobs_wrapper(
+                data_dir=data_dir,
+                database_url=database_url,
+                lodes_year=lodes_year,
+                state_abbreviation=state_abbreviation,
+            )
+
+        # Import OSM data.
+        osm_wrapper(
+            city=city,
+            country=country,
+            data_dir=data_dir,
+            database_url=database_url,
+            fips_code=fips_code,
+            region=region,
+            osm_import_mode=osm_import_mode,
+        )
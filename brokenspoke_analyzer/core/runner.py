@@ -2,6 +2,7 @@
 
 import json
 import multiprocessing
+import os
 import pathlib
 import subprocess
 import typing
@@ -13,19 +14,35 @@ NON_US_STATE_FIPS = "0"
 NON_US_STATE_ABBREV = "ZZ"
 
 
-def run(cmd: typing.Sequence[str]) -> None:
-    """Run a command and log the stdout/stderr at the trace level."""
+def run(cmd: typing.Sequence[str], env: typing.Mapping[str, str] | None = None) -> None:
+    """
+    Run a command and log the stdout/stderr at the trace level.
+
+    The variables of `env` are added to the environment of the command.
+    """
     logger.debug(f"cmd={' '.join(cmd)}")
     p = subprocess.run(
         cmd,
         check=True,
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
+        env={**os.environ, **env} if env else None,
     )
     for line in p.stdout.splitlines():
         logger.trace(line.decode("utf-8").strip())
 
 
+def pgoptions_env(pgoptions: str | None) -> dict[str, str] | None:
+    """
+    Build the environment passing session settings to a PostgreSQL client.
+
+    The settings are appended to the `PGOPTIONS` of the current environment.
+    """
+    if not pgoptions:
+        return None
+    return {"PGOPTIONS": " ".join(filter(None, [os.getenv("PGOPTIONS"), pgoptions]))}
+
+
 def run_osmium_extract(
     polygon_file_path: pathlib.Path,
     region_file_path: pathlib.Path,
@@ -44,14 +61,35 @@ def run_osmium_extract(
     run(osmium_cmd)
 
 
+def run_osmium_extract_config(
+    config_file_path: pathlib.Path,
+    region_file_path: pathlib.Path,
+) -> None:
+    """Reduce the OSM file to several boundaries at once with OSMium."""
+    osmium_cmd = [
+        "osmium",
+        "extract",
+        "-c",
+        str(config_file_path.resolve(strict=True)),
+        str(region_file_path.resolve(strict=True)),
+        "--overwrite",
+    ]
+    run(osmium_cmd)
+
+
 def run_osm2pgrouting(
     database_url: str,
     schema: str,
     prefix: str,
     configuration_file: pathlib.Path,
     osm_file: pathlib.Path,
+    pgoptions: str | None = None,
 ) -> None:
-    """Import OSM data into pgRouting."""
+    """
+    Import OSM data into pgRouting.
+
+    The `pgoptions` session settings are applied to the connection.
+    """
     # Parse the database connection string.
     urlparts = urllib.parse.urlparse(database_url)
 
@@ -78,7 +116,7 @@ def run_osm2pgrouting(
         str(configuration_file.resolve(strict=True)),
         "--clean",
     ]
-    run(osm2pgrouting_cmd)
+    run(osm2pgrouting_cmd, pgoptions_env(pgoptions))
 
 
 def run_osm2pgsql(
@@ -88,8 +126,13 @@ def run_osm2pgsql(
     osm_file: pathlib.Path,
     number_processes: int | None = 0,
     prefix: str | None = "neighborhood_osm_full",
+    pgoptions: str | None = None,
 ) -> None:
-    """Import OSM data into PostGIS."""
+    """
+    Import OSM data into PostGIS.
+
+    The `pgoptions` session settings are applied to the connections.
+    """
     # Asserts are here to make MyPy happy.
     if number_processes is None:
         raise ValueError("number_processes cannot be None")
@@ -134,7 +177,7 @@ def run_osm2pgsql(
         osm2pgsql_cmd.insert(1, "--schema")
 
     # Run it.
-    run(osm2pgsql_cmd)
+    run(osm2pgsql_cmd, pgoptions_env(pgoptions))
 
 
 def run_psql_command_string(database_url: str, command: str) -> None:
@@ -143,24 +186,65 @@ def run_psql_command_string(database_url: str, command: str) -> None:
     run(psql_cmd)
 
 
-def run_osm_convert(
+def run_osmium_extract_bbox(
     osm_file: pathlib.Path,
     bbox: tuple[float, float, float, float],
 ) -> pathlib.Path:
-    """Convert OSM data."""
-    output = osm_file.with_suffix(".clipped.osm")
+    """
+    Clip the OSM file to a boundary box with OSMium.
+
+    The default `complete_ways` strategy keeps the references of the ways crossing
+    the boundary box consistent.
+    """
+    output = osm_file.with_name(
+        osm_file.name.removesuffix(".osm.pbf") + ".clipped.osm.pbf"
+    )
     bbox_str = ",".join([str(i) for i in bbox])
-    osmconvert_cmd = [
-        "osmconvert",
+    osmium_cmd = [
+        "osmium",
+        "extract",
+        "-b",
+        bbox_str,
         str(osm_file.resolve(strict=True)),
-        "--drop-broken-refs",
-        f"-b={bbox_str}",
-        f"-o={output.resolve()}",
+        "-o",
+        str(output.resolve()),
+        "--overwrite",
     ]
-    run(osmconvert_cmd)
+    run(osmium_cmd)
     return output
 
 
+def run_osmium_fileinfo(osm_file: pathlib.Path) -> typing.Any:
+    """
+    Return a dict describing an OSM file and its data.
+
+    The data is read entirely, to compute its actual boundary box among others.
+    """
+    osmium_cmd = [
+        "osmium",
+        "fileinfo",
+        "--extended",
+        "--json",
+        str(osm_file.resolve(strict=True)),
+    ]
+    logger.debug(f"cmd={' '.join(osmium_cmd)}")
+    fileinfo = subprocess.run(osmium_cmd, check=True, capture_output=True)
+    return json.loads(fileinfo.stdout)
+
+
+def run_osmium_cat(osm_file: pathlib.Path, output: pathlib.Path) -> None:
+    """Convert an OSM file to the format matching the output extension."""
+    osmium_cmd = [
+        "osmium",
+        "cat",
+        str(osm_file.resolve(strict=True)),
+        "-o",
+        str(output.resolve()),
+        "--overwrite",
+    ]
+    run(osmium_cmd)
+
+
 def run_docker_info() -> typing.Any:
     """Return a dict containing Docker system information."""
     docker_info_cmd = ["docker", "info", "--format", "json"]
@@ -170,7 +254,11 @@ def run_docker_info() -> typing.Any:
 
 
 def run_pgsql2shp(database_url: str, filename: pathlib.Path, table: str) -> None:
-    """Dump a PostGIS table into a shapefile."""
+    """
+    Dump a PostGIS table into a shapefile.
+
+    `table` can also be a SELECT query, in which case its result is dumped.
+    """
     # Parse the database connection string.
     urlparts = urllib.parse.urlparse(database_url)
 
@@ -190,28 +278,3 @@ def run_pgsql2shp(database_url: str, filename: pathlib.Path, table: str) -> None
         table,
     ]
     run(pgsql2shp_cmd)
-
-
-def run_ogr2ogr_geojson_export(
-    database_url: str,
-    filename: pathlib.Path,
-    table: str,
-) -> None:
-    """Dump a table into a GeoJSON file."""
-    urlparts = urllib.parse.urlparse(database_url)
-    ogr2ogr_cmd = [
-        "ogr2ogr",
-        "-skipfailures",
-        "-t_srs",
-        "EPSG:4326",
-        "-f",
-        "GeoJSON",
-        str(filename.resolve()),
-        (
-            f"PG:host={urlparts.hostname} user={urlparts.username} "
-            f"password={urlparts.password} dbname={urlparts.path[1:]}"
-        ),
-        "-sql",
-        f"select * from {table}",
-    ]
-    run(ogr2ogr_cmd)
@@ -1,13 +1,16 @@
 """Define utility functions."""
 
+import contextlib
 import gzip
 import hashlib
 import pathlib
+import time
 import typing
 import zipfile
 from enum import Enum
 
 import geopandas as gpd
+import numpy as np
 from loguru import logger
 from slugify import slugify
 
@@ -15,6 +18,13 @@ from slugify import slugify
 # https://epsg.io/3857
 PSEUDO_MERCATOR_CRS = "EPSG:3857"
 
+# Largest grid position which can be encoded into a Z-order key.
+MAX_GRID_POSITION = 2**32 - 1
+
+# World Geodetic System 1984, used by the OSM data.
+# https://epsg.io/4326
+WGS84_CRS = "EPSG:4326"
+
 
 class PolygonFormat(Enum):
     """Represent the available polygon formats from polygons.openstreetmap.fr."""
@@ -186,7 +196,7 @@ def prepare_city_inputs(
         root = pathlib.Path("./data")
     city_dir = root.resolve(strict=True) / normalized_city_name
     city_data_file = city_dir / normalized_city_name
-    city_osm_file = city_data_file.with_suffix(".osm")
+    city_osm_file = city_data_file.with_suffix(".osm.pbf")
     city_boundary_file = city_data_file.with_suffix(".shp")
 
     city_dir.mkdir(parents=True, exist_ok=True)
@@ -244,3 +254,77 @@ def is_usa(country: str) -> bool:
 
     """
     return country.upper() in ["US", "USA", "UNITED STATES"]
+
+
+def morton_key(cols: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    Interleave the bits of grid positions into Z-order keys.
+
+    Neighbouring cells get close keys, which keeps them close in the indexes.
+
+    Example:
+        >>> morton_key(np.array([0, 1, 0, 1, 2]), np.array([0, 0, 1, 1, 0])).tolist()
+        [0, 1, 2, 3, 4]
+    """
+    cols = np.asarray(cols, dtype=np.int64)
+    rows = np.asarray(rows, dtype=np.int64)
+    if (cols < 0).any() or (rows < 0).any():
+        raise ValueError("grid positions cannot be negative")
+    if (cols > MAX_GRID_POSITION).any() or (rows > MAX_GRID_POSITION).any():
+        raise ValueError("grid positions must fit in 32 bits")
+
+    def spread(values: np.ndarray) -> np.ndarray:
+        """Insert a zero bit before each bit of the values."""
+        v = values.astype(np.uint64)
+        for shift, mask in (
+            (16, 0x0000FFFF0000FFFF),
+            (8, 0x00FF00FF00FF00FF),
+            (4, 0x0F0F0F0F0F0F0F0F),
+            (2, 0x3333333333333333),
+            (1, 0x5555555555555555),
+        ):
+            v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+        return v
+
+    return spread(cols) | (spread(rows) << np.uint64(1))
+
+
+def synthetic_geoid20(cols: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    Derive 15 character lowercase block IDs from grid positions.
+
+    The Z-order key of each position is written in base 26, using the letters as
+    digits. The IDs are therefore reproducible, unique for a grid, and sort in the
+    Z-order.
+
+    Example:
+        >>> synthetic_geoid20(np.array([0, 1, 0, 1]), np.array([0, 0, 1, 1])).tolist()
+        ['aaaaaaaaaaaaaaa', 'aaaaaaaaaaaaaab', 'aaaaaaaaaaaaaac', 'aaaaaaaaaaaaaad']
+    """
+    blockid_len = 15
+    keys = morton_key(cols, rows)
+    letters = np.empty((len(keys), blockid_len), dtype=np.uint8)
+    for position in range(blockid_len - 1, -1, -1):
+        keys, digits = np.divmod(keys, np.uint64(26))
+        letters[:, position] = digits + ord("a")
+    return letters.view(f"S{blockid_len}").ravel().astype(str)
+
+
+@contextlib.contextmanager
+def timed(timings: dict[str, float] | None, name: str) -> typing.Iterator[None]:
+    """
+    Record the duration of a block, in seconds, into `timings` if specified.
+
+    Examples:
+        >>> timings = {}
+        >>> with timed(timings, "phase"):
+        ...     pass
+        >>> list(timings)
+        ['phase']
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = time.perf_counter() - start
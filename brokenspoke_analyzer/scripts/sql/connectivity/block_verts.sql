@@ -1,6 +1,7 @@
 ----------------------------------------
 -- INPUTS
 -- location: neighborhood
+-- :nb_unlogged must be set to UNLOGGED to skip the WAL, or left empty
 --
 -- Transient seed table for the per-block reachability search. Maps each census
 -- block to the network vertices of its road_ids. The boundary filter is required to
@@ -8,7 +9,7 @@
 ----------------------------------------
 DROP TABLE IF EXISTS generated.neighborhood_block_verts;
 
-CREATE TABLE generated.neighborhood_block_verts AS
+CREATE :nb_unlogged TABLE generated.neighborhood_block_verts AS
 SELECT
     cb.geoid20,
     v.vert_id
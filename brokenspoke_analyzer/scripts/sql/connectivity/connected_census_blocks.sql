@@ -3,10 +3,11 @@
 -- location: neighborhood
 -- :nb_max_trip_distance and :nb_output_srid psql vars must be set before running this script,
 --      e.g. psql -v nb_max_trip_distance=2680 -v nb_output_srid=2163 -f connected_census_blocks.sql
+-- :nb_unlogged must be set to UNLOGGED to skip the WAL, or left empty
 ----------------------------------------
 DROP TABLE IF EXISTS generated.neighborhood_connected_census_blocks;
 
-CREATE TABLE generated.neighborhood_connected_census_blocks (
+CREATE :nb_unlogged TABLE generated.neighborhood_connected_census_blocks (
     source_blockid20 VARCHAR(15),
     target_blockid20 VARCHAR(15),
     low_stress BOOLEAN,
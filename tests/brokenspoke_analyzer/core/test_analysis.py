@@ -1,11 +1,16 @@
 """Test the analysis module."""
 
+import geopandas as gpd
+import shapely
 from osmnx import (
     geocoder,
     settings,
 )
 
-from brokenspoke_analyzer.core import analysis
+from brokenspoke_analyzer.core import (
+    analysis,
+    utils,
+)
 
 
 def test_osmnx_query_multipolygon():
@@ -21,3 +26,27 @@ def test_osmnx_query_multipolygon():
     city_gdf_type = city_gdf["class"].iloc[0]
     print(city_gdf_type)
     assert city_gdf_type == "boundary"
+
+
+def test_create_synthetic_population_grid():
+    """Ensure the synthetic population covers the area with unique blocks."""
+    area = gpd.GeoDataFrame(
+        geometry=[shapely.box(0, 0, 1000, 1000)], crs=utils.PSEUDO_MERCATOR_CRS
+    )
+    grid = analysis.create_synthetic_population(area, 100, 100, population=10)
+    assert len(grid) == 100
+    assert grid.crs == area.crs
+    assert (grid["POP20"] == 10).all()
+    assert grid["GEOID20"].str.fullmatch("[a-z]{15}").all()
+    assert grid["GEOID20"].is_unique
+    assert grid.union_all().covers(area.geometry.iloc[0])
+
+
+def test_create_synthetic_population_deterministic_ids():
+    """Ensure the synthetic block IDs are the same from one run to another."""
+    area = gpd.GeoDataFrame(
+        geometry=[shapely.Point(0, 0).buffer(1000)], crs=utils.PSEUDO_MERCATOR_CRS
+    )
+    first = analysis.create_synthetic_population(area, 100, 100)
+    second = analysis.create_synthetic_population(area, 100, 100)
+    assert first["GEOID20"].tolist() == second["GEOID20"].tolist()
@@ -0,0 +1,80 @@
+"""Test the batch module."""
+
+import concurrent.futures
+import time
+
+from brokenspoke_analyzer.core import (
+    batch,
+    constant,
+)
+
+
+def make_city(name: str, size: constant.CitySize) -> batch.BatchCity:
+    """Create a batch city of a given size."""
+    return batch.BatchCity("united states", name, "texas", "0", size)
+
+
+def test_largest_cities_do_not_share_the_budget():
+    """Ensure two XXL cities never run at the same time."""
+    pending = batch.longest_first(
+        [
+            make_city("small", constant.CitySize.S),
+            make_city("huge", constant.CitySize.XXL),
+            make_city("huger", constant.CitySize.XXL),
+        ]
+    )
+    selected = batch.next_cities(pending, available=4, budget=4)
+    assert [city.city for city in selected] == ["huge"]
+
+
+def test_small_cities_fill_the_remaining_budget():
+    """Ensure the smaller cities start alongside a large one."""
+    pending = batch.longest_first(
+        [make_city(f"small-{i}", constant.CitySize.XS) for i in range(4)]
+        + [make_city("large", constant.CitySize.XL)]
+    )
+    selected = batch.next_cities(pending, available=4, budget=4)
+    assert [city.city for city in selected] == ["large", "small-0", "small-1"]
+
+
+def test_resume_skips_the_completed_cities(tmp_path):
+    """Ensure resuming a batch only processes the remaining cities."""
+    cities = [make_city(name, constant.CitySize.M) for name in ("a", "b", "c")]
+    with batch.Ledger(tmp_path / "ledger.sqlite") as ledger:
+        ledger.register(cities)
+        ledger.start(cities[0])
+        ledger.succeed(cities[0], tmp_path, {constant.Phase.PREPARE: 1.0})
+        ledger.start(cities[1])
+        ledger.fail(cities[1], "boom")
+
+        resumed = ledger.select(cities, resume=True)
+        retried = ledger.select(cities, retry_failed=True)
+
+    assert [city.city for city in resumed] == ["c"]
+    assert [city.city for city in retried] == ["b"]
+
+
+def test_due_retry_waits_for_a_running_city():
+    """Ensure a due retry which does not fit in the budget does not busy-loop."""
+    retried = make_city("retried", constant.CitySize.XXL)
+    upcoming = make_city("upcoming", constant.CitySize.XS)
+    now = time.monotonic()
+    retry_at = {retried: now - 1, upcoming: now + 3600}
+    assert batch.retry_timeout(retry_at, [retried], now) is None
+    assert batch.retry_timeout(retry_at, [retried, upcoming], now) > 0
+
+    # The retry is due but the running city takes the whole budget, so the wait
+    # lasts until it completes.
+    with concurrent.futures.ThreadPoolExecutor() as pool:
+        running = pool.submit(time.sleep, 0.2)
+        done = batch.wait_for_progress({running}, retry_at, [retried])
+    assert done == {running}
+
+
+def test_upcoming_retry_is_waited_for():
+    """Ensure the scheduler sleeps until the next retry when nothing runs."""
+    city = make_city("retried", constant.CitySize.S)
+    start = time.monotonic()
+    done = batch.wait_for_progress(set(), {city: start + 0.1}, [city])
+    assert done == set()
+    assert time.monotonic() - start >= 0.1
@@ -0,0 +1,37 @@
+"""Test the dbcore module."""
+
+from brokenspoke_analyzer.core.database import dbcore
+
+
+def test_control_group_limits_take_precedence():
+    """Ensure the resources of a container are limited by its control group."""
+    files = {
+        dbcore.CPU_ONLINE_FILE: "0-15\n",
+        dbcore.MEMINFO_FILE: "MemTotal:       65536000 kB\n",
+        dbcore.CGROUP_CPU_MAX_FILE: "400000 100000\n",
+        dbcore.CGROUP_MEMORY_MAX_FILE: "8589934592\n",
+    }
+    assert dbcore.resources_from(files.get) == (4, 8192)
+
+
+def test_settings_pending_a_restart_do_not_match():
+    """Ensure the settings not in effect yet are reported."""
+    expected = dbcore.recommended_settings(8, 16384)
+    applied = dbcore.SettingCheck(
+        "shared_buffers", expected["shared_buffers"], "524288", "8kB"
+    )
+    pending = dbcore.SettingCheck(
+        "shared_buffers", expected["shared_buffers"], "16384", "8kB", True
+    )
+    assert applied.ok
+    assert not pending.ok
+
+
+def test_workload_settings_only_raise_the_settings_in_effect():
+    """Ensure a workload never lowers the settings configured globally."""
+    lower = dbcore.SettingCheck("work_mem", "16MB", "131072", "kB")
+    higher = dbcore.SettingCheck("work_mem", "512MB", "131072", "kB")
+    switched = dbcore.SettingCheck("jit", "off", "on")
+    assert not lower.raises
+    assert higher.raises
+    assert switched.raises
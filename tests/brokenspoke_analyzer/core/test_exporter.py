@@ -0,0 +1,89 @@
+"""Test the exporter module."""
+
+import json
+import pathlib
+
+import geopandas as gpd
+import pytest
+import shapely
+import sqlalchemy
+
+from brokenspoke_analyzer.core import exporter
+
+# Columns of a destination table, including its array of census blocks.
+DESTINATION_COLUMNS = {
+    "id": "int4",
+    "blockid20": "_varchar",
+    "road_ids": "_int4",
+    "geom_pt": "geometry",
+}
+
+
+@pytest.fixture
+def destinations(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Serve a destination table as `read_postgis` does, arrays as lists."""
+
+    def read_postgis(*args: object, **kwargs: object) -> gpd.GeoDataFrame:
+        return gpd.GeoDataFrame(
+            {
+                "id": [1, 2],
+                "blockid20": [["480019501001000", "480019501001001"], None],
+                "road_ids": [[1, 2], []],
+                "geom_pt": [shapely.Point(-97.7, 30.3), shapely.Point(-97.8, 30.2)],
+            },
+            geometry="geom_pt",
+            crs=exporter.WGS84_SRID,
+        )
+
+    monkeypatch.setattr(exporter.gpd, "read_postgis", read_postgis)
+
+
+@pytest.mark.usefixtures("destinations")
+def test_export_array_columns_to_geojson(tmp_path: pathlib.Path) -> None:
+    """Ensure the array columns are exported as JSON arrays."""
+    engine = sqlalchemy.create_engine("sqlite://")
+    (geojson_file,) = exporter.export_to_geojson(
+        tmp_path,
+        "generated.neighborhood_schools",
+        DESTINATION_COLUMNS,
+        engine,
+        exporter.TableProfile(),
+    )
+    assert geojson_file.name == "neighborhood_schools.geojson"
+    features = json.loads(geojson_file.read_text())["features"]
+    assert features[0]["properties"]["blockid20"] == [
+        "480019501001000",
+        "480019501001001",
+    ]
+    assert features[0]["properties"]["road_ids"] == [1, 2]
+    assert features[1]["properties"]["blockid20"] is None
+    assert features[1]["properties"]["road_ids"] == []
+
+
+@pytest.mark.usefixtures("destinations")
+def test_export_array_columns_to_fgb(tmp_path: pathlib.Path) -> None:
+    """Ensure the array columns are exported as JSON strings."""
+    engine = sqlalchemy.create_engine("sqlite://")
+    (fgb_file,) = exporter.export_to_fgb(
+        tmp_path,
+        "generated.neighborhood_schools",
+        DESTINATION_COLUMNS,
+        engine,
+        exporter.TableProfile(),
+    )
+    gdf = gpd.read_file(fgb_file)
+    assert json.loads(gdf["blockid20"][0]) == ["480019501001000", "480019501001001"]
+    assert json.loads(gdf["road_ids"][1]) == []
+
+
+def test_export_date_is_left_out_of_the_dbf_digest(tmp_path: pathlib.Path) -> None:
+    """Ensure re-exporting an unchanged shapefile keeps the digest of its .dbf."""
+    records = b"\x41\x00\x00\x00" + b"records" * 1000
+    previous = tmp_path / "previous.dbf"
+    previous.write_bytes(b"\x03\x7c\x0a\x13" + records)
+    current = tmp_path / "current.dbf"
+    current.write_bytes(b"\x03\x7d\x01\x02" + records)
+    changed = tmp_path / "changed.dbf"
+    changed.write_bytes(b"\x03\x7d\x01\x02" + records.upper())
+    assert exporter.file_sha256(previous) == exporter.file_sha256(current)
+    assert exporter.file_sha256(previous) != exporter.file_sha256(changed)
@@ -40,6 +40,110 @@ bna-batch.py [OPTIONS] [BATCH_FILE]
 
     Defaults to `measure`.
 
+- `--database-url` _database-url_
+
+  - URL of the database to run the analyses against.
+
+    The database is configured once and kept warm for the whole batch, the
+    tables being reset between cities. May also be set with the `DATABASE_URL`
+    environment variable.
+
+    Defaults to a database started with Docker Compose for the duration of the
+    batch.
+
+- `--workers` _workers_
+
+  - Number of cities to process concurrently.
+
+    When processing several cities at once, each city is analyzed in a
+    database of its own, created on the same server and dropped afterwards.
+
+    Defaults to one city per 2 cores of the database server, as detected from
+    the server itself, within the limit of its `max_connections`.
+
+- `--pipeline` / `--no-pipeline`
+
+  - Pipeline the phases of the analyses.
+
+    Each phase runs in a pool of its own: the input files of the upcoming
+    cities are prepared while the database imports and computes the current
+    ones, and the results are exported while the next cities are imported. As
+    with `--workers`, each city is analyzed in a database of its own.
+
+    Defaults to `--no-pipeline`.
+
+- `--template` / `--no-template`
+
+  - Create the databases of the cities from a template database containing
+    the extensions, the schemas and the speed tables, instead of configuring
+    each of them.
+
+    The template is created with `bna configure template` if it does not exist
+    yet.
+
+    Defaults to `--template`.
+
+- `--retries` _retries_
+
+  - Number of times to retry a city which failed to process.
+
+    The retries are delayed exponentially, starting at 1 minute.
+
+    Defaults to `2`.
+
+- `--resume`
+
+  - Skip the cities which were already processed, or which failed, during a
+    previous run of the batch.
+
+- `--retry-failed`
+
+  - Only process the cities which failed during a previous run of the batch.
+
+    Combined with `--resume`, process the failed cities along with the ones
+    which were not processed yet.
+
+- `--batch-extract` / `--no-batch-extract`
+
+  - Extract the OSM data of all the cities sharing the same region file in a
+    single pass before running the analyses.
+
+    Defaults to `--batch-extract`.
+
+### Scheduling
+
+When processing several cities at once, the largest cities are started first,
+and each city uses a share of the workers weighted by its size. An `XXL` city
+uses all of them, so two of them never share the database server, while the
+smaller cities fill the remaining slots.
+
+The size of a city is read from the optional `test_size` column of the batch
+file (`XS`, `S`, `M`, `L`, `XL` or `XXL`). Otherwise it is estimated from the
+size of its OSM extract, or from the area of its boundary.
+
+### Pipeline
+
+With `--pipeline`, the cities flow through 4 pools, one per phase:
+
+- `prepare`: 2 workers, downloading and extracting the input files, at most 3
+  cities ahead of the database,
+- `import`: 1 worker, importing the input files of the next city while the
+  current ones are computed,
+- `compute`: `--workers` slots, weighted by the size of the cities,
+- `export`: 2 workers, exporting the results while the next cities are being
+  imported.
+
+### Ledger
+
+The outcome of each city is recorded into a SQLite database next to the export
+directory (e.g. `results.sqlite` for `./results`): its status, the number of
+attempts, the duration of each phase, the error of the last failure and the
+location of its results.
+
+```bash
+sqlite3 results.sqlite "select city, status, attempts, error from cities"
+```
+
 ### Batch file format
 
 `cities.csv`:
@@ -50,21 +154,34 @@ country,region,city,fips_code
 ```
 """
 
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
 import csv
+import multiprocessing
 import os
 import pathlib
+import time
+import typing
 from typing import Annotated
 
+import rich
 import typer
 
 from brokenspoke_analyzer.cli import (
     common,
+    configure,
+    prepare,
     root,
     run_with,
 )
 from brokenspoke_analyzer.core import (
+    analysis,
+    batch,
     constant,
 )
+from brokenspoke_analyzer.core.database import dbcore
 
 BatchFile = Annotated[
     pathlib.Path,
@@ -77,14 +194,65 @@ BatchFile = Annotated[
         resolve_path=True,
     ),
 ]
+BatchDatabaseURL = Annotated[
+    str | None,
+    typer.Option(
+        help="database URL, defaults to a Docker Compose database",
+        envvar="DATABASE_URL",
+    ),
+]
+BatchExtract = Annotated[
+    bool,
+    typer.Option(
+        help="extract the OSM data of the cities sharing a region file in one pass"
+    ),
+]
+DEFAULT_BATCH_RETRIES = 2
+BatchRetries = Annotated[
+    int,
+    typer.Option(min=0, help="number of times to retry a city which failed"),
+]
+Pipeline = Annotated[
+    bool,
+    typer.Option(help="run each phase of the analyses in a pool of its own"),
+]
+Template = Annotated[
+    bool,
+    typer.Option(help="create the city databases from a template database"),
+]
+Resume = Annotated[
+    bool,
+    typer.Option(help="skip the cities processed during a previous run"),
+]
+RetryFailed = Annotated[
+    bool,
+    typer.Option(help="only process the cities which failed during a previous run"),
+]
+Workers = Annotated[
+    int | None,
+    typer.Option(
+        min=1,
+        help="number of cities to process concurrently, defaults to the database "
+        "cores divided by 2 within the limit of its connections",
+    ),
+]
 
 
 def main(
     batch_file: BatchFile = pathlib.Path("cities.csv"),
+    database_url: BatchDatabaseURL = None,
     export_dir: common.ExportDirOpt = common.DEFAULT_EXPORT_DIR,
     lodes_year: common.LODESYear = None,
     parts: common.ComputeParts = None,
     worldpop_year: common.WorldPopYear = common.DEFAULT_WORLDPOP_YEAR,
+    workers: Workers = None,
+    retries: BatchRetries = DEFAULT_BATCH_RETRIES,
+    *,
+    batch_extract: BatchExtract = True,
+    pipeline: Pipeline = False,
+    resume: Resume = False,
+    retry_failed: RetryFailed = False,
+    template: Template = True,
 ) -> None:
     """Process a batch of cities."""
     # Disable logging.
@@ -101,26 +269,390 @@ def main(
 
     # Read the CSV file.
     with batch_file.open() as f:
-        reader = csv.DictReader(f)
-
-        # Process each entry.
-        for row in reader:
-            country = row["country"]
-            city = row["city"]
-            region = row.get("region") or country
-            fips_code = row["fips_code"]
+        rows = list(csv.DictReader(f))
+    cities = [
+        (
+            row["country"],
+            row["city"],
+            row.get("region") or row["country"],
+            row["fips_code"],
+        )
+        for row in rows
+    ]
+
+    # Extract the OSM data of all the cities at once.
+    if batch_extract:
+        asyncio.run(
+            prepare.prepare_extracts_(
+                cities=cities,
+                cache_dir=None,
+                data_dir=common.DEFAULT_DATA_DIR,
+                mirror=None,
+                no_cache=False,
+            )
+        )
+
+    # Size the cities, trusting the size from the batch file if any.
+    sizes = set(constant.CitySize)
+    batch_cities = [
+        batch.BatchCity(
+            country,
+            city,
+            region,
+            fips_code,
+            size=constant.CitySize(row["test_size"])
+            if row.get("test_size") in sizes
+            else batch.estimate_size(country, city, region, common.DEFAULT_DATA_DIR),
+        )
+        for row, (country, city, region, fips_code) in zip(rows, cities, strict=True)
+    ]
+
+    # Select the cities to process from the outcomes of the previous runs.
+    export_dir.mkdir(parents=True, exist_ok=True)
+    ledger = batch.Ledger(batch.ledger_path(export_dir))
+    ledger.register(batch_cities)
+    batch_cities = ledger.select(batch_cities, resume=resume, retry_failed=retry_failed)
+
+    # Process the cities.
+    options = {
+        "export_dir": export_dir,
+        "lodes_year": lodes_year,
+        "with_parts": parts,
+        "worldpop_year": worldpop_year,
+    }
+    with ledger, run_with.provision_database(database_url) as database_url_:
+        engine = dbcore.get_engine(database_url_)
+        workers_ = workers or batch.default_workers(
+            dbcore.server_resources(engine)[0],
+            dbcore.max_connections(engine),
+            pipeline=pipeline,
+        )
+
+        # Prepare the template of the city databases.
+        template_ = None
+        if template and (pipeline or workers_ > 1):
+            template_ = dbcore.TEMPLATE_DATABASE
+            if not dbcore.template_exists(engine, template_):
+                configure.template(database_url_, template_)
+
+        if pipeline:
+            failures = process_pipelined(
+                database_url_,
+                batch_cities,
+                ledger,
+                retries,
+                workers_,
+                template_,
+                **options,
+            )
+        elif workers_ == 1:
+            failures = process_sequentially(
+                database_url_, batch_cities, ledger, retries, **options
+            )
+        else:
+            failures = process_concurrently(
+                database_url_,
+                batch_cities,
+                ledger,
+                retries,
+                workers_,
+                template_,
+                **options,
+            )
+    if failures:
+        raise typer.Exit(code=1)
+
+
+def describe(city: batch.BatchCity) -> str:
+    """Describe a city in the console."""
+    return f"{city.city}, {city.region}, {city.country} ({city.size})"
+
+
+def process_sequentially(
+    database_url: str,
+    cities: list[batch.BatchCity],
+    ledger: batch.Ledger,
+    retries: int,
+    **kwargs: typing.Any,
+) -> list[batch.BatchCity]:
+    """
+    Process the cities one after the other, against the same database.
+
+    Returns the cities which could not be processed.
+    """
+    console = rich.get_console()
+    engine = dbcore.get_engine(database_url)
+    failures = []
+    for city in cities:
+        for attempt in range(1, retries + 2):
+            # Start from a clean state.
+            dbcore.reset_tables(engine)
 
             # Run the analysis.
-            run_with.compose(
-                city=city,
-                country=country,
-                export_dir=export_dir,
-                fips_code=fips_code,
-                lodes_year=lodes_year,
-                region=region,
-                with_parts=parts,
-                worldpop_year=worldpop_year,
+            ledger.start(city)
+            timings: dict[str, float] = {}
+            try:
+                output = asyncio.run(
+                    run_with.run_(
+                        city=city.city,
+                        country=city.country,
+                        database_url=database_url,
+                        fips_code=city.fips_code,
+                        region=city.region,
+                        timings=timings,
+                        **kwargs,
+                    )
+                )
+            except Exception as e:  # noqa: BLE001
+                console.log(f"[red]Failed to process {describe(city)}: {e}")
+                ledger.fail(city, str(e), timings)
+                if attempt > retries:
+                    failures.append(city)
+                else:
+                    time.sleep(batch.backoff(attempt))
+            else:
+                console.log(f"[green]Processed {describe(city)}")
+                ledger.succeed(city, output, timings)
+                break
+    return failures
+
+
+def process_concurrently(
+    database_url: str,
+    cities: list[batch.BatchCity],
+    ledger: batch.Ledger,
+    retries: int,
+    workers: int,
+    template: str | None = None,
+    **kwargs: typing.Any,
+) -> list[batch.BatchCity]:
+    """
+    Process several cities at once, each one in a database of its own.
+
+    The cities are scheduled longest first, within a budget of `workers` slots
+    weighted by the size of the cities. The failed cities are scheduled again
+    once their retry delay has elapsed.
+
+    Returns the cities which could not be processed.
+    """
+    console = rich.get_console()
+    pending = batch.longest_first(cities)
+    running: dict[concurrent.futures.Future, batch.BatchCity] = {}
+    attempts: dict[batch.BatchCity, int] = {}
+    retry_at: dict[batch.BatchCity, float] = {}
+    available = workers
+    failures = []
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=root._verbose_callback,
+        initargs=(0,),
+    ) as pool:
+        while pending or running:
+            # Start the cities fitting in the available budget, unless they are
+            # waiting to be retried.
+            now = time.monotonic()
+            ready = [city for city in pending if retry_at.get(city, now) <= now]
+            for city in batch.next_cities(ready, available, workers):
+                pending.remove(city)
+                available -= batch.weight(city.size, workers)
+                ledger.start(city)
+                attempts[city] = attempts.get(city, 0) + 1
+                future = pool.submit(
+                    run_with.run_isolated,
+                    database_url,
+                    city.country,
+                    city.city,
+                    city.region,
+                    template,
+                    fips_code=city.fips_code,
+                    share=batch.server_share(city.size, workers),
+                    **kwargs,
+                )
+                running[future] = city
+
+            # Wait for a city to complete to release its share of the budget, or
+            # for the next retry to be due.
+            done = batch.wait_for_progress(running, retry_at, pending)
+            for future in done:
+                city = running.pop(future)
+                available += batch.weight(city.size, workers)
+                try:
+                    output, timings = future.result()
+                except Exception as e:  # noqa: BLE001
+                    console.log(f"[red]Failed to process {describe(city)}: {e}")
+                    ledger.fail(city, str(e))
+                    if attempts[city] > retries:
+                        failures.append(city)
+                    else:
+                        delay = batch.backoff(attempts[city])
+                        retry_at[city] = time.monotonic() + delay
+                        pending.append(city)
+                        pending = batch.longest_first(pending)
+                else:
+                    console.log(f"[green]Processed {describe(city)}")
+                    ledger.succeed(city, output, timings)
+
+    return failures
+
+
+def process_pipelined(  # noqa: C901, PLR0912, PLR0915
+    database_url: str,
+    cities: list[batch.BatchCity],
+    ledger: batch.Ledger,
+    retries: int,
+    workers: int,
+    template: str | None = None,
+    **kwargs: typing.Any,
+) -> list[batch.BatchCity]:
+    """
+    Process the cities through a pipeline, running each phase in a pool of its own.
+
+    A city moves to the next phase as soon as its current one completes, so that
+    the network, the database and the exports are kept busy at the same time.
+    The cities are prepared ahead of the database within a bounded prefetch, and
+    each city is analyzed in a database of its own, created before its import
+    and dropped after its export.
+
+    Returns the cities which could not be processed.
+    """
+    prepare_, import_, compute_, export_ = constant.Phase
+    console = rich.get_console()
+    limits = {**batch.PHASE_WORKERS, compute_: workers}
+    prefetch = limits[prepare_] + limits[import_]
+    ready: dict[constant.Phase, list[batch.BatchCity]] = {
+        phase: [] for phase in constant.Phase
+    }
+    ready[prepare_] = batch.longest_first(cities)
+    running: dict[concurrent.futures.Future, tuple[constant.Phase, batch.BatchCity]]
+    running = {}
+    busy: collections.Counter[constant.Phase] = collections.Counter()
+    databases: dict[batch.BatchCity, tuple[str, contextlib.ExitStack]] = {}
+    timings: dict[batch.BatchCity, dict[str, float]] = {}
+    attempts: dict[batch.BatchCity, int] = {}
+    retry_at: dict[batch.BatchCity, float] = {}
+    available = workers
+    failures = []
+
+    def submit(phase: constant.Phase, city: batch.BatchCity, url: str) -> None:
+        """Submit a phase of a city to its pool."""
+        future = pools[phase].submit(
+            run_with.run_phases,
+            url,
+            city.country,
+            city.city,
+            city.region,
+            fips_code=city.fips_code,
+            phases=[phase],
+            share=batch.server_share(city.size, workers),
+            **kwargs,
+        )
+        running[future] = (phase, city)
+        busy[phase] += 1
+
+    def fail(phase: constant.Phase, city: batch.BatchCity, error: Exception) -> None:
+        """Record the failure of a city, and schedule its retry if any."""
+        console.log(f"[red]Failed to {phase} {describe(city)}: {error}")
+        if city in databases:
+            databases.pop(city)[1].close()
+        ledger.fail(city, str(error), timings.pop(city))
+        if attempts[city] > retries:
+            failures.append(city)
+            return
+        retry_at[city] = time.monotonic() + batch.backoff(attempts[city])
+        ready[prepare_] = batch.longest_first([*ready[prepare_], city])
+
+    def drop_databases() -> None:
+        """Drop the databases of the cities still in the pipeline."""
+        for _, database in databases.values():
+            database.close()
+
+    with contextlib.ExitStack() as stack:
+        stack.callback(drop_databases)
+        pools = {
+            phase: stack.enter_context(
+                concurrent.futures.ProcessPoolExecutor(
+                    max_workers=limit,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=root._verbose_callback,
+                    initargs=(0,),
+                )
             )
+            for phase, limit in limits.items()
+        }
+        while any(ready.values()) or running:
+            now = time.monotonic()
+
+            # Prepare the upcoming cities, within the prefetch bound.
+            for city in list(ready[prepare_]):
+                if (
+                    busy[prepare_] >= limits[prepare_]
+                    or busy[prepare_] + len(ready[import_]) >= prefetch
+                ):
+                    break
+                if retry_at.get(city, now) > now:
+                    continue
+                ready[prepare_].remove(city)
+                ledger.start(city)
+                attempts[city] = attempts.get(city, 0) + 1
+                timings[city] = {}
+                submit(prepare_, city, database_url)
+
+            # Import the prepared cities into databases of their own, without
+            # getting further ahead of the computations than the import pool.
+            while (
+                ready[import_]
+                and busy[import_] + len(ready[compute_]) < limits[import_]
+            ):
+                city = ready[import_].pop(0)
+                _, _, slug = analysis.osmnx_query(city.country, city.city, city.region)
+                name = dbcore.database_name(slug)
+                database = contextlib.ExitStack()
+                try:
+                    city_url = database.enter_context(
+                        run_with.city_database(database_url, name, template)
+                    )
+                except Exception as e:  # noqa: BLE001
+                    fail(import_, city, e)
+                    continue
+                databases[city] = (city_url, database)
+                submit(import_, city, city_url)
+
+            # Compute the imported cities fitting in the available budget.
+            for city in batch.next_cities(ready[compute_], available, workers):
+                ready[compute_].remove(city)
+                available -= batch.weight(city.size, workers)
+                submit(compute_, city, databases[city][0])
+
+            # Export the computed cities.
+            while ready[export_] and busy[export_] < limits[export_]:
+                city = ready[export_].pop(0)
+                submit(export_, city, databases[city][0])
+
+            # Wait for a phase to complete, or for the next retry to be due.
+            done = batch.wait_for_progress(running, retry_at, ready[prepare_])
+            for future in done:
+                phase, city = running.pop(future)
+                busy[phase] -= 1
+                if phase == compute_:
+                    available += batch.weight(city.size, workers)
+                try:
+                    output, phase_timings = future.result()
+                except Exception as e:  # noqa: BLE001
+                    fail(phase, city, e)
+                    continue
+
+                # Move the city to its next phase.
+                timings[city].update(phase_timings)
+                upcoming = batch.next_phase(phase)
+                if upcoming:
+                    ready[upcoming] = batch.longest_first([*ready[upcoming], city])
+                else:
+                    databases.pop(city)[1].close()
+                    console.log(f"[green]Processed {describe(city)}")
+                    ledger.succeed(city, output, timings.pop(city))
+
+    return failures
 
 
 if __name__ == "__main__":